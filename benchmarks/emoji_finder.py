@@ -0,0 +1,105 @@
+"""
+Micro-benchmarks for EmojiFinder.
+
+Run from the repository root:
+    python benchmarks/emoji_finder.py
+"""
+import pathlib
+import random
+import timeit
+
+from PySide6.QtCore import QRegularExpression
+
+from emojis.db.db import EMOJI_DB
+
+from qextrawidgets.emoji_utils import EmojiFinder, EmojiTrie
+
+CORPUS_PATH = pathlib.Path(__file__).parent.parent / "tests" / "emoji-test.txt"
+
+
+def load_corpus() -> list:
+    """Returns every line of the unicode emoji-test.txt file."""
+    with open(CORPUS_PATH, encoding="utf-8") as file:
+        return file.read().splitlines()
+
+
+def find_with_fresh_regex(text: str) -> int:
+    """Previous behavior: compiles a new QRegularExpression on every call."""
+    regex = QRegularExpression(
+        EmojiFinder.getEmojiPattern(),
+        QRegularExpression.PatternOption.UseUnicodePropertiesOption
+    )
+    iterator = regex.globalMatch(text)
+    count = 0
+    while iterator.hasNext():
+        iterator.next()
+        count += 1
+    return count
+
+
+def find_with_shared_regex(text: str) -> int:
+    return sum(1 for _ in EmojiFinder.findEmojis(text))
+
+
+def bench_per_line(lines: list, repeat: int = 5):
+    print(f"findEmojis per line ({len(lines)} lines, best of {repeat}):")
+    for name, func in (("fresh regex", find_with_fresh_regex), ("shared regex", find_with_shared_regex)):
+        best = min(timeit.repeat(lambda: [func(line) for line in lines], number=1, repeat=repeat))
+        print(f"  {name:<14} {best * 1000:8.2f} ms  ({best / len(lines) * 1e6:6.2f} us/call)")
+
+
+def bench_compile(repeat: int = 5, number: int = 200):
+    print(f"regex acquisition ({number} calls, best of {repeat}):")
+    fresh = min(timeit.repeat(lambda: QRegularExpression(
+        EmojiFinder.getEmojiPattern(),
+        QRegularExpression.PatternOption.UseUnicodePropertiesOption
+    ).optimize(), number=number, repeat=repeat))
+    shared = min(timeit.repeat(EmojiFinder.getRegex, number=number, repeat=repeat))
+    print(f"  {'compile':<14} {fresh / number * 1e6:8.2f} us/call")
+    print(f"  {'registry':<14} {shared / number * 1e6:8.2f} us/call")
+
+
+def make_chat_log(lines: int, seed: int = 42) -> str:
+    """Builds a chat transcript mixing plain words, emojis and skin tones."""
+    rng = random.Random(seed)
+    words = ["hello", "ok", "see", "you", "tomorrow", "lol", "that's", "great", "news", "👍🏽", "::"]
+    emojis = [emoji.emoji for emoji in EMOJI_DB]
+    rows = []
+    for number in range(lines):
+        parts = [f"[{number:05}] user{rng.randint(1, 9)}:"]
+        for _ in range(rng.randint(4, 14)):
+            parts.append(rng.choice(emojis) if rng.random() < 0.25 else rng.choice(words))
+        rows.append(" ".join(parts))
+    return "\n".join(rows)
+
+
+def bench_engines(text: str, repeat: int = 3):
+    print(f"findEmojiObjects on a chat log ({len(text)} chars, best of {repeat}):")
+    EmojiTrie.instance()  # build outside of the timing
+    previous = EmojiFinder.engine()
+    try:
+        for engine in EmojiFinder.Engine:
+            EmojiFinder.setEngine(engine)
+            best = min(timeit.repeat(lambda: sum(1 for _ in EmojiFinder.findEmojiObjects(text, True)),
+                                     number=1, repeat=repeat))
+            print(f"  {engine.name:<14} {best * 1000:8.2f} ms")
+    finally:
+        EmojiFinder.setEngine(previous)
+
+
+def bench_tokenize(rows: list, repeat: int = 3):
+    print(f"tokenizing {len(rows)} table rows (best of {repeat}):")
+    per_row = min(timeit.repeat(lambda: [list(EmojiFinder.findEmojiObjects(row, True)) for row in rows],
+                                number=1, repeat=repeat))
+    batch = min(timeit.repeat(lambda: EmojiFinder.tokenize(rows), number=1, repeat=repeat))
+    print(f"  {'per row':<14} {per_row * 1000:8.2f} ms")
+    print(f"  {'tokenize':<14} {batch * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    corpus = load_corpus()
+    bench_compile()
+    bench_per_line(corpus)
+    chat_log = make_chat_log(5000)
+    bench_engines(chat_log)
+    bench_tokenize(chat_log.splitlines())
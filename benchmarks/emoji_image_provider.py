@@ -0,0 +1,196 @@
+"""
+Benchmarks for EmojiImageProvider's paint path.
+
+Run from the repository root:
+    python benchmarks/emoji_image_provider.py
+"""
+import sys
+import tempfile
+import timeit
+
+from PySide6.QtCore import QSize, QUrl, QUrlQuery, QRectF
+from PySide6.QtGui import QPixmap, QPixmapCache, QImage, QPainter, QImageReader
+from PySide6.QtWidgets import QApplication
+from emojis.db import get_emojis_by_category
+from emojis.db.db import EMOJI_DB
+
+from twemoji_api.api import get_emoji_path
+
+from qextrawidgets.emoji_utils import EmojiImageProvider, EmojiAtlas, EmojiSourceCache
+
+
+def url_key_lookup(emoji, margin: int, size: QSize, dpr: float) -> QPixmap:
+    """Previous cache hit path: QUrl + QUrlQuery key, serialized twice."""
+    url = QUrl()
+    url.setScheme("twemoji")
+    url.setPath(emoji[0][0])
+    query_params = QUrlQuery()
+    query_params.addQueryItem("margin", str(margin))
+    query_params.addQueryItem("width", str(size.width()))
+    query_params.addQueryItem("height", str(size.height()))
+    query_params.addQueryItem("dpr", str(dpr))
+    url.setQuery(query_params)
+    pixmap = QPixmap()
+    url.toString()
+    QPixmapCache.find(url.toString(), pixmap)
+    return pixmap
+
+
+def bench_cache_hits(emojis: list, size: QSize, dpr: float, repeat: int = 5):
+    # Warm both caches so only the hit path is measured
+    for emoji in emojis:
+        pixmap = EmojiImageProvider.getPixmap(emoji, 0, size, dpr)
+        QPixmapCache.insert(EmojiImageProvider.getUrl(emoji[0][0], 0, size, dpr).toString(), pixmap)
+
+    print(f"cache hit per cell ({len(emojis)} cells, best of {repeat}):")
+    for name, func in (("url key", url_key_lookup), ("tuple key", EmojiImageProvider.getPixmap)):
+        best = min(timeit.repeat(lambda: [func(emoji, 0, size, dpr) for emoji in emojis], number=1, repeat=repeat))
+        print(f"  {name:<14} {best / len(emojis) * 1e6:8.2f} us/cell")
+
+
+def bench_picker_scroll(size: QSize, dpr: float, budget: int, passes: int = 2):
+    """Scrolls the whole picker twice and reports how the emoji cache behaved."""
+    cache = EmojiImageProvider.cache()
+    cache.clear()
+    cache.resetStats()
+    cache.setMaxBytes(budget)
+    elapsed = timeit.timeit(lambda: [EmojiImageProvider.getPixmap(emoji, 0, size, dpr) for emoji in EMOJI_DB],
+                            number=passes)
+    print(f"picker scroll x{passes} at {size.width()}px dpr {dpr}, budget {budget // 1024 ** 2} MB: "
+          f"{elapsed * 1000:.0f} ms, entries={cache.count()} bytes={cache.bytes()} "
+          f"hits={cache.hits()} misses={cache.misses()} evictions={cache.evictions()}")
+
+
+def bench_disk_cache(emojis: list, size: QSize, dpr: float):
+    """Cold start cost of rendering a category, without and with the persistent cache."""
+    print(f"cold start of {len(emojis)} emojis at {size.width()}px dpr {dpr}:")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, cache_directory in (("rasterize", None), ("disk (first)", directory), ("disk (next)", directory)):
+            EmojiImageProvider.setDiskCacheDirectory(cache_directory)
+            elapsed = timeit.timeit(lambda: [EmojiImageProvider.renderImage(emoji, 0, size, dpr) for emoji in emojis],
+                                    number=1)
+            print(f"  {name:<14} {elapsed * 1000:8.2f} ms")
+        EmojiImageProvider.setDiskCacheDirectory(None)
+
+
+def bench_atlas(size: QSize, dpr: float, repeat: int = 5):
+    """Whole database at one size: individual pixmaps vs one sprite atlas."""
+    cache = EmojiImageProvider.cache()
+    cache.clear()
+    cache.setMaxBytes(1024 ** 3)
+    pixmaps = [EmojiImageProvider.getPixmap(emoji, 0, size, dpr) for emoji in EMOJI_DB]
+    atlas = EmojiAtlas(0, size, dpr)
+    atlas.build(EMOJI_DB)
+    print(f"whole database at {size.width()}px dpr {dpr}:")
+    print(f"  pixmaps        {len(pixmaps)} pixmaps, {cache.bytes()} bytes")
+    print(f"  atlas          {atlas.pageCount()} pages, {atlas.bytes()} bytes")
+
+    target = QImage(size.width() * 40, size.height() * 50, QImage.Format.Format_ARGB32_Premultiplied)
+    target.setDevicePixelRatio(dpr)
+
+    def paint(atlas_mode: bool):
+        painter = QPainter(target)
+        for number, emoji in enumerate(EMOJI_DB):
+            x, y = (number % 40) * size.width(), (number // 40) * size.height()
+            if atlas_mode:
+                page, source = EmojiImageProvider.getAtlasPixmap(emoji, 0, size, dpr)
+                painter.drawPixmap(QRectF(x, y, size.width(), size.height()), page, source)
+            else:
+                painter.drawPixmap(x, y, EmojiImageProvider.getPixmap(emoji, 0, size, dpr))
+        painter.end()
+
+    EmojiImageProvider.addAtlas(atlas)
+    for name, atlas_mode in (("pixmaps", False), ("atlas", True)):
+        best = min(timeit.repeat(lambda: paint(atlas_mode), number=1, repeat=repeat))
+        print(f"  paint {name:<8} {best * 1000:8.2f} ms")
+    EmojiImageProvider.clearAtlases()
+    cache.clear()
+
+
+def bench_prewarm(emojis: list, size: QSize, dpr: float):
+    """First paint of a category: cold cache vs pre-warmed in the background."""
+    cache = EmojiImageProvider.cache()
+    print(f"first paint of {len(emojis)} emojis at {size.width()}px dpr {dpr}:")
+    for name, prewarmed in (("cold", False), ("prewarmed", True)):
+        cache.clear()
+        if prewarmed:
+            EmojiImageProvider.prewarm(emojis, size, dpr)
+            EmojiImageProvider.prewarmThreadPool().waitForDone()
+            QApplication.processEvents()
+        elapsed = timeit.timeit(lambda: [EmojiImageProvider.getPixmap(emoji, 0, size, dpr) for emoji in emojis],
+                                number=1)
+        print(f"  {name:<14} {elapsed * 1000:8.2f} ms")
+
+
+def read_scaled(emoji, size: QSize) -> QImage:
+    """Previous raster step: opens and decodes the file for every size."""
+    reader = QImageReader(str(get_emoji_path(emoji[1])))
+    reader.setScaledSize(size)
+    return reader.read()
+
+
+def bench_source_cache(emojis: list, sides: tuple):
+    """Each emoji at several sizes (grid, preview, document, table): re-reading vs parsed sources."""
+    print(f"{len(emojis)} emojis at {len(sides)} sizes:")
+    elapsed = timeit.timeit(lambda: [read_scaled(emoji, QSize(side, side)) for side in sides for emoji in emojis],
+                            number=1)
+    print(f"  {'read per size':<14} {elapsed * 1000:8.2f} ms, {len(emojis) * len(sides)} file opens and parses")
+    for source_format in EmojiSourceCache.Format:
+        cache = EmojiSourceCache(max_entries=len(emojis), source_format=source_format)
+        elapsed = timeit.timeit(lambda: [cache.render(emoji, QSize(side, side)) for side in sides for emoji in emojis],
+                                number=1)
+        print(f"  {source_format.name.lower() + ' sources':<14} {elapsed * 1000:8.2f} ms, "
+              f"opens={cache.opens()} parses={cache.parses()} avoided={cache.hits()}")
+
+
+def image_serial() -> int:
+    """Serial number of the next QImage pixel buffer (Qt numbers them in QImage.cacheKey)."""
+    return QImage(1, 1, QImage.Format.Format_ARGB32).cacheKey() >> 32
+
+
+def padded_by_painter(emoji, margin: int, size: QSize, dpr: float) -> QPixmap:
+    """Previous margin handling: scaled image, then a second image and a QPainter pass."""
+    image = EmojiImageProvider.sourceCache().render(emoji, QSize(int(size.width() * dpr), int(size.height() * dpr)))
+    image.setDevicePixelRatio(dpr)
+    final_image = QImage(int((size.width() + margin * 2) * dpr), int((size.height() + margin * 2) * dpr),
+                         QImage.Format.Format_ARGB32_Premultiplied)
+    final_image.setDevicePixelRatio(dpr)
+    final_image.fill(0)
+    painter = QPainter(final_image)
+    painter.drawImage(margin, margin, image)
+    painter.end()
+    return QPixmap.fromImage(final_image)
+
+
+def padded_directly(emoji, margin: int, size: QSize, dpr: float) -> QPixmap:
+    return QPixmap.fromImageInPlace(EmojiImageProvider.renderImage(emoji, margin, size, dpr))
+
+
+def bench_margin(emojis: list, size: QSize, dpr: float, margin: int = 1):
+    """Cache misses of QTwemojiTextDocument insertions (emoji_margin=1)."""
+    print(f"document insertion miss, {len(emojis)} emojis at {size.width()}px dpr {dpr} margin {margin}:")
+    for source_format in EmojiSourceCache.Format:
+        EmojiImageProvider.setSourceFormat(source_format)
+        # Parse the sources first: only the raster step is compared
+        [EmojiImageProvider.renderImage(emoji, margin, size, dpr) for emoji in emojis]
+        for name, func in (("painter pass", padded_by_painter), ("direct", padded_directly)):
+            start = image_serial()
+            elapsed = timeit.timeit(lambda: [func(emoji, margin, size, dpr) for emoji in emojis], number=1)
+            buffers = image_serial() - start - 1
+            print(f"  {source_format.name.lower()} {name:<13} {elapsed / len(emojis) * 1e6:8.2f} us, "
+                  f"{buffers / len(emojis):.1f} image buffers per insertion")
+    EmojiImageProvider.setSourceFormat(EmojiSourceCache.Format.Png)
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    QPixmapCache.setCacheLimit(256 * 1024)
+    smileys = list(get_emojis_by_category("Smileys & Emotion"))
+    bench_cache_hits(smileys, QSize(32, 32), 1.0)
+    bench_picker_scroll(QSize(32, 32), 2.0, 10 * 1024 ** 2)
+    bench_picker_scroll(QSize(32, 32), 2.0, 64 * 1024 ** 2)
+    bench_disk_cache(smileys, QSize(32, 32), 2.0)
+    bench_atlas(QSize(32, 32), 2.0)
+    bench_prewarm(smileys, QSize(32, 32), 2.0)
+    bench_source_cache(smileys, (24, 32, 48, 64))
+    bench_margin(smileys, QSize(18, 18), 2.0)
@@ -0,0 +1,293 @@
+"""
+Benchmarks for QTwemojiTextDocument.
+
+Run from the repository root:
+    python benchmarks/twemoji_text_document.py
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PySide6.QtCore import QRectF
+from PySide6.QtGui import QTextCursor, QImage, QPainter
+from PySide6.QtWidgets import QApplication
+
+from emoji_finder import make_chat_log
+from qextrawidgets.documents import QTwemojiTextDocument
+
+
+def bench_keystrokes(lines: int, keys: str = "ok :smile: 😂 done"):
+    """Per-keystroke latency while typing at the end of a document of the given length."""
+    document = QTwemojiTextDocument()
+    # As in a text edit: documents only report where edits occur once they have a layout
+    document.documentLayout()
+    # Only the typing is measured, so the log is loaded without emojis to convert
+    document.setPlainText(make_chat_log(lines).encode("ascii", "ignore").decode())
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertBlock()
+
+    timings = []
+    for key in keys:
+        start = time.perf_counter()
+        cursor.insertText(key)
+        timings.append(time.perf_counter() - start)
+    print(f"  {lines:>6} lines ({document.characterCount():>8} chars): "
+          f"{sum(timings) / len(timings) * 1000:8.3f} ms/keystroke, worst {max(timings) * 1000:8.3f} ms")
+
+
+def bench_load(lines: int):
+    """Time to load (and convert) a chat log full of emojis, as when pasting or opening it."""
+    text = make_chat_log(lines)
+    document = QTwemojiTextDocument()
+    document.documentLayout()
+    start = time.perf_counter()
+    document.setPlainText(text)
+    elapsed = time.perf_counter() - start
+    images = sum(fragment.length() for block in document._blocks() for fragment in document.emoji_fragments(block))
+    print(f"  {lines:>6} lines ({images:>6} emojis): {elapsed * 1000:10.1f} ms, "
+          f"{elapsed / max(images, 1) * 1e6:8.1f} us/emoji")
+
+
+def bench_progressive_load(lines: int):
+    """Longest the event loop is blocked while a chat log full of emojis is loaded progressively."""
+    text = make_chat_log(lines)
+    document = QTwemojiTextDocument()
+    document.documentLayout()
+    document.setProgressive(True)
+    start = time.perf_counter()
+    document.setPlainText(text)
+    worst = time.perf_counter() - start
+    slices = 0
+    while document.isProcessing():
+        slice_start = time.perf_counter()
+        QApplication.processEvents()
+        worst = max(worst, time.perf_counter() - slice_start)
+        slices += 1
+    elapsed = time.perf_counter() - start
+    print(f"  {lines:>6} lines: {elapsed * 1000:10.1f} ms in {slices:>5} slices, "
+          f"longest block {worst * 1000:8.1f} ms")
+
+
+def bench_lazy_load(lines: int, lazy: bool):
+    """Images held by a chat log full of emojis, converted entirely or around the first screen only."""
+    document = QTwemojiTextDocument()
+    document.documentLayout()
+    document.setLazy(lazy)
+    document.setVisibleBlocks(0, 30)
+    start = time.perf_counter()
+    document.setPlainText(make_chat_log(lines))
+    elapsed = time.perf_counter() - start
+    images = sum(fragment.length() for block in document._blocks() for fragment in document.emoji_fragments(block))
+    print(f"  {lines:>6} lines, {'lazy ' if lazy else 'eager'}: {elapsed * 1000:10.1f} ms, {images:>6} images")
+
+
+def bench_export(lines: int, repeat: int = 5):
+    """Time of toPlainText and of copying the last 20 lines, on a converted chat log."""
+    document = QTwemojiTextDocument()
+    document.setPlainText(make_chat_log(lines))
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.movePosition(QTextCursor.MoveOperation.PreviousBlock, QTextCursor.MoveMode.KeepAnchor, 20)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        document.toPlainText()
+    export = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        document.selectionToPlainText(cursor)
+    selection = (time.perf_counter() - start) / repeat
+    print(f"  {lines:>6} lines: toPlainText {export * 1000:9.2f} ms, selection {selection * 1000:8.3f} ms")
+
+
+def bench_full_passes(emojis: int):
+    """Time per emoji of converting a whole document to images and back."""
+    document = QTwemojiTextDocument(twemoji=False, alias_replacement=False)
+    document.setPlainText(("😂" * 50 + "\n") * (emojis // 50))
+    start = time.perf_counter()
+    document.setTwemoji(True)
+    twemojize = time.perf_counter() - start
+    start = time.perf_counter()
+    document.setTwemoji(False)
+    detwemojize = time.perf_counter() - start
+    print(f"  {emojis:>6} emojis: twemojize {twemojize * 1000:9.1f} ms ({twemojize / emojis * 1e6:6.1f} us/emoji), "
+          f"detwemojize {detwemojize * 1000:9.1f} ms ({detwemojize / emojis * 1e6:6.1f} us/emoji)")
+
+
+def bench_resize(lines: int):
+    """Time of changing the emoji size of a converted chat log (pixmaps already rendered)."""
+    document = QTwemojiTextDocument()
+    document.setPlainText(make_chat_log(lines))
+    sizes = (14, 16, 18)
+    for size in sizes:
+        document.setEmojiSize(size)
+    start = time.perf_counter()
+    for size in sizes:
+        document.setEmojiSize(size)
+    elapsed = (time.perf_counter() - start) / len(sizes)
+    print(f"  {lines:>6} lines: {elapsed * 1000:9.1f} ms/resize")
+
+
+def bench_zoom_resources(lines: int, sizes=(12, 14, 16, 18, 20, 24)):
+    """Resources held by a chat log after zooming through several emoji sizes."""
+    document = QTwemojiTextDocument()
+    document.setPlainText(make_chat_log(lines))
+    for size in sizes:
+        document.setEmojiSize(size)
+    print(f"  {lines:>6} lines, before release: {document.resourceCount():>6} resources, "
+          f"{document.resourceBytes() / 1024:9.1f} KiB")
+    start = time.perf_counter()
+    released = document.releaseUnusedResources()
+    elapsed = time.perf_counter() - start
+    print(f"  {lines:>6} lines, after release:  {document.resourceCount():>6} resources, "
+          f"{document.resourceBytes() / 1024:9.1f} KiB ({released} released in {elapsed * 1000:.1f} ms)")
+
+
+def bench_paint(lines: int, frames: int = 200, height: int = 600):
+    """Time to paint a viewport of a chat log while scrolling through it, emojis resolved on every paint."""
+    document = QTwemojiTextDocument()
+    document.setTextWidth(800)
+    document.setPlainText(make_chat_log(lines))
+    image = QImage(800, height, QImage.Format.Format_ARGB32_Premultiplied)
+    step = max(1, int(document.size().height() - height) // frames)
+    start = time.perf_counter()
+    for frame in range(frames):
+        top = frame * step
+        painter = QPainter(image)
+        painter.translate(0, -top)
+        document.drawContents(painter, QRectF(0, top, 800, height))
+        painter.end()
+    elapsed = time.perf_counter() - start
+    print(f"  {lines:>6} lines: {elapsed / frames * 1000:8.2f} ms/frame")
+
+
+def bench_many_documents(documents: int, lines: int = 5):
+    """Time to create, convert and paint many small documents (e.g. chat bubbles)."""
+    messages = make_chat_log(documents * lines).split("\n")
+    image = QImage(400, 200, QImage.Format.Format_ARGB32_Premultiplied)
+    start = time.perf_counter()
+    bubbles = []
+    for index in range(documents):
+        document = QTwemojiTextDocument()
+        document.setPlainText("\n".join(messages[index * lines:(index + 1) * lines]))
+        painter = QPainter(image)
+        document.drawContents(painter)
+        painter.end()
+        bubbles.append(document)
+    elapsed = time.perf_counter() - start
+    print(f"  {documents:>6} documents: {elapsed * 1000:9.1f} ms ({elapsed / documents * 1000:.2f} ms/document)")
+
+
+def bench_paste(emojis: int):
+    """Time per emoji of pasting a run of emojis into a document."""
+    text = "😂😄🎉👍 " * (emojis // 4)
+    document = QTwemojiTextDocument()
+    document.documentLayout()
+    cursor = QTextCursor(document)
+    # Pixmaps already rendered
+    cursor.insertText(text[:10])
+    start = time.perf_counter()
+    cursor.insertText(text)
+    elapsed = time.perf_counter() - start
+    print(f"  {emojis:>6} emojis: {elapsed * 1000:9.1f} ms ({elapsed / emojis * 1e6:6.1f} us/emoji)")
+
+
+def bench_stream(lines: int, line_limit: int = 1000):
+    """Time, peak Python memory and longest event loop block of streaming a chat log file within a line limit."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "log.txt")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(make_chat_log(lines))
+
+        for mode in ("read + setPlainText", "stream", "stream async"):
+            document = QTwemojiTextDocument()
+            document.documentLayout()
+            document.setLimitTreatment(QTwemojiTextDocument.LimitTreatment.RemoveFirstLines)
+            document.setLineLimit(line_limit)
+            tracemalloc.start()
+            start = time.perf_counter()
+            worst = 0.0
+            if mode == "read + setPlainText":
+                with open(path, encoding="utf-8") as file:
+                    document.setPlainText(file.read())
+                worst = time.perf_counter() - start
+            else:
+                document.streamPlainText(path, asynchronous=mode == "stream async")
+                worst = time.perf_counter() - start
+                while document.isStreaming():
+                    slice_start = time.perf_counter()
+                    QApplication.processEvents()
+                    worst = max(worst, time.perf_counter() - slice_start)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {lines:>6} lines, {mode:<20}: {elapsed * 1000:9.1f} ms, peak {peak / 1024:9.1f} KiB, "
+                  f"longest block {worst * 1000:8.1f} ms, {document.blockCount()} blocks")
+
+
+def bench_append(lines: int, line_limit: int = 10000, slack: int = 0, appended: int = 5000):
+    """Throughput of appending lines one at a time to a full log with a line limit, oldest lines dropped."""
+    log = make_chat_log(lines + appended).split("\n")
+    document = QTwemojiTextDocument()
+    document.documentLayout()
+    document.setUndoRedoEnabled(False)
+    document.setLimitTreatment(QTwemojiTextDocument.LimitTreatment.RemoveFirstLines)
+    document.setLineLimit(line_limit)
+    document.setLineLimitSlack(slack)
+    document.setPlainText("\n".join(log[:lines]))
+    cursor = QTextCursor(document)
+    start = time.perf_counter()
+    for line in log[lines:]:
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText("\n" + line)
+    elapsed = time.perf_counter() - start
+    print(f"  {lines:>6} lines, limit {line_limit}, slack {slack:>3}: {appended / elapsed:9.0f} lines/s, "
+          f"{document.blockCount()} blocks")
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    print("typing at the end of a chat log:")
+    for size in (500, 2000, 8000, 32000):
+        bench_keystrokes(size)
+    print("loading a chat log:")
+    for size in (100, 500, 2000):
+        bench_load(size)
+    print("loading a chat log progressively:")
+    for size in (100, 500, 2000):
+        bench_progressive_load(size)
+    print("loading a chat log, lazily or not:")
+    for size in (500, 2000, 8000):
+        bench_lazy_load(size, False)
+        bench_lazy_load(size, True)
+    print("exporting a chat log:")
+    for size in (500, 2000, 8000):
+        bench_export(size)
+    print("converting a whole document:")
+    for size in (1000, 10000, 50000):
+        bench_full_passes(size)
+    print("resizing the emojis of a chat log:")
+    for size in (500, 2000, 8000):
+        bench_resize(size)
+    print("resources after zooming:")
+    for size in (500, 2000):
+        bench_zoom_resources(size)
+    print("painting a chat log while scrolling:")
+    for size in (500, 2000):
+        bench_paint(size)
+    print("many small documents:")
+    for size in (50, 200):
+        bench_many_documents(size)
+    print("pasting emojis:")
+    for size in (1000, 10000):
+        bench_paste(size)
+    print("streaming a chat log file:")
+    for size in (2000, 8000):
+        bench_stream(size)
+    print("appending to a log with a line limit:")
+    for size in (1000, 10000):
+        for slack in (0, 500):
+            bench_append(size, slack=slack)
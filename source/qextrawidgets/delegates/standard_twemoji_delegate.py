@@ -1,7 +1,7 @@
-import re
 import typing
+from collections import OrderedDict
 
-from PySide6.QtCore import QModelIndex, Qt, QPoint, QSize
+from PySide6.QtCore import QModelIndex, Qt, QPoint, QSize, QRectF
 from PySide6.QtGui import QPainter, QPalette, QFontMetrics
 from PySide6.QtWidgets import (
     QStyledItemDelegate,
@@ -10,14 +10,23 @@ from PySide6.QtWidgets import (
 )
 from emojis import emojis
 
-from qextrawidgets.emoji_utils import EmojiImageProvider
+from qextrawidgets.emoji_utils import EmojiImageProvider, EmojiFinder
 
 
 class QStandardTwemojiDelegate(QStyledItemDelegate):
     """
     Delegate that renders text with Twemoji support.
+    In atlas mode, emojis are drawn from the sprite atlas of their size (see EmojiAtlas).
+    prepareTexts tokenizes the texts of many rows (e.g. a page about to be shown) in one pass.
     """
 
+    def __init__(self, parent=None, cache_limit: int = 1024):
+        super().__init__(parent)
+        # text -> blocks, filled by paint and prepareTexts (least recently used first)
+        self._blocks_cache: OrderedDict = OrderedDict()
+        self._cache_limit = cache_limit
+        self._atlas_mode = False
+
     def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex) -> None:
         """
         Renders the delegate using the given painter and style option.
@@ -59,7 +68,7 @@ class QStandardTwemojiDelegate(QStyledItemDelegate):
             QStyle.SubElement.SE_ItemViewItemText, opt, widget
         )
 
-        blocks = self.get_text_blocks(text)
+        blocks = self._cached_text_blocks(text)
 
         # ===== total width =====
         emoji_size = QSize(fm.ascent(), fm.ascent())
@@ -102,15 +111,17 @@ class QStandardTwemojiDelegate(QStyledItemDelegate):
         image_cursor = QPoint(text_rect.left() + offset_x, img_y)
 
         # ===== drawing =====
+        dpr = painter.device().devicePixelRatio()
         for block in blocks:
             if isinstance(emoji := block, emojis.db.Emoji):
-                pixmap = EmojiImageProvider.getPixmap(
-                    emoji,
-                    0,
-                    emoji_size,
-                    painter.device().devicePixelRatio(),
-                )
-                painter.drawPixmap(image_cursor, pixmap)
+                if self._atlas_mode:
+                    sprite = EmojiImageProvider.getAtlasPixmap(emoji, 0, emoji_size, dpr)
+                    if sprite is not None:
+                        page, source = sprite
+                        painter.drawPixmap(QRectF(image_cursor, source.size() / dpr), page, source)
+                else:
+                    pixmap = EmojiImageProvider.getPixmap(emoji, 0, emoji_size, dpr)
+                    painter.drawPixmap(image_cursor, pixmap)
                 advance = emoji_size.width()
             else:
                 painter.drawText(text_cursor, block)
@@ -121,6 +132,56 @@ class QStandardTwemojiDelegate(QStyledItemDelegate):
 
         painter.restore()
 
+    def atlasMode(self) -> bool:
+        """
+        Returns whether emojis are drawn from sprite atlases.
+
+        Returns:
+            bool: True if atlas mode is enabled.
+        """
+        return self._atlas_mode
+
+    def setAtlasMode(self, atlas_mode: bool) -> None:
+        """
+        Draws emojis from one sprite atlas per size instead of individual pixmaps.
+
+        Args:
+            atlas_mode (bool): True to enable atlas mode.
+        """
+        self._atlas_mode = atlas_mode
+
+    def prepareTexts(self, texts: typing.Iterable[str]) -> int:
+        """
+        Tokenizes many texts (e.g. every row of the visible page) in one pass, so the
+        following paint calls find their blocks ready.
+
+        Args:
+            texts (typing.Iterable[str]): The texts that are about to be painted.
+
+        Returns:
+            int: How many texts were tokenized (the others were already cached).
+        """
+        pending = [text for text in dict.fromkeys(texts) if text not in self._blocks_cache]
+        # More than the cache holds would evict the first ones before they are painted
+        pending = pending[:self._cache_limit]
+        for text, blocks in zip(pending, self.get_texts_blocks(pending)):
+            self._store_blocks(text, blocks)
+        return len(pending)
+
+    def _cached_text_blocks(self, text: str) -> typing.List[typing.Union[str, emojis.db.Emoji]]:
+        blocks = self._blocks_cache.get(text)
+        if blocks is None:
+            blocks = self.get_text_blocks(text)
+            self._store_blocks(text, blocks)
+        else:
+            self._blocks_cache.move_to_end(text)
+        return blocks
+
+    def _store_blocks(self, text: str, blocks: typing.List[typing.Union[str, emojis.db.Emoji]]):
+        self._blocks_cache[text] = blocks
+        while len(self._blocks_cache) > self._cache_limit:
+            self._blocks_cache.popitem(last=False)
+
     @staticmethod
     def get_text_blocks(text: str) -> typing.List[typing.Union[str, emojis.db.Emoji]]:
         """
@@ -132,17 +193,32 @@ class QStandardTwemojiDelegate(QStyledItemDelegate):
         Returns:
             typing.List[typing.Union[str, emojis.db.Emoji]]: A list of text blocks and Emoji objects.
         """
-        result = []
-        for text_block in re.split(emojis.RE_EMOJI_TO_TEXT, text):
-            text_block = QStandardTwemojiDelegate._remove_emoji_color(text_block)
-            if text_block:
-                emoji = emojis.db.get_emoji_by_code(text_block)
-                if emoji:
-                    result.append(emoji)
-                else:
-                    result.append(text_block)
-        return result
+        return QStandardTwemojiDelegate.get_texts_blocks([text])[0]
 
     @staticmethod
-    def _remove_emoji_color(text: str) -> str:
-        return re.sub(r"[\U0001F3FB-\U0001F3FF]", "", text)
+    def get_texts_blocks(texts: typing.Sequence[str]) -> typing.List[typing.List[typing.Union[str, emojis.db.Emoji]]]:
+        """
+        Splits many texts into blocks of text and Emoji objects, tokenizing all of them at once.
+        Skin tones are ignored (the base emoji is drawn), and sequences that aren't known emojis
+        are drawn as the emojis they are made of.
+
+        Args:
+            texts (typing.Sequence[str]): The input texts.
+
+        Returns:
+            typing.List[typing.List[typing.Union[str, emojis.db.Emoji]]]: The blocks of each text.
+        """
+        result = []
+        for text, spans in zip(texts, EmojiFinder.tokenize(texts)):
+            blocks = []
+            last = 0
+            for i in range(0, len(spans), 3):
+                start, end, emoji_id = spans[i], spans[i + 1], spans[i + 2]
+                if start > last:
+                    blocks.append(text[last:start])
+                blocks.append(EmojiFinder.emojiFromId(emoji_id))
+                last = end
+            if last < len(text):
+                blocks.append(text[last:])
+            result.append(blocks)
+        return result
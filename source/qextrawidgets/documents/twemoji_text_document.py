@@ -1,39 +1,142 @@
+import contextlib
+import os
+import time
 import typing
+from collections import OrderedDict
+from enum import Enum
 
-from PySide6.QtCore import QSignalBlocker, QSize, QRegularExpressionMatch, QUrl
+from PySide6.QtCore import QSignalBlocker, QSize, QRegularExpressionMatch, QUrl, QTimer, Signal
 from PySide6.QtGui import (QTextDocument, QTextCursor, QTextImageFormat,
                            QTextCharFormat, QFontMetrics, QTextFragment, QTextBlock,
-                           QFont)
-from emojis.db import Emoji, get_emoji_by_alias
+                           QFont, QTextFormat, QPixmap)
+from emojis.db import Emoji
 
-from qextrawidgets.emoji_utils import EmojiFinder, EmojiImageProvider
+from qextrawidgets.emoji_utils import EmojiFinder, EmojiImageProvider, EmojiResolver, utf16_length
 
 T = typing.TypeVar('T')
 
 
 class QTwemojiTextDocument(QTextDocument):
+    """
+    Text document that shows emojis as Twemoji images and replaces aliases (:smile:) by emojis.
+
+    In progressive mode, large changes (e.g. loading a huge text) are converted in short
+    time slices from the event loop, visible blocks first, so the document stays usable
+    meanwhile. twemojizeProgress reports the processed and total characters.
+
+    In lazy mode, only the blocks around the visible ones (see setVisibleBlocks) hold emoji
+    images, so images and their resources scale with the viewport instead of the document:
+    blocks within the prefetch margin are converted, and blocks beyond the release distance
+    go back to text. These conversions are never undo steps nor modifications of the document:
+    they only happen while there is nothing to undo or redo (e.g. a log viewer, or a text that
+    was just loaded). Once there is, the converted blocks stay as they are until it is cleared,
+    while edits are still converted within them.
+
+    Emoji pixmaps aren't rendered per document: loadResource resolves the twemoji URLs from
+    the pixmap cache shared by every document (see EmojiImageProvider.cache) and adds them to
+    the document, which only holds references to the shared pixmaps, so their memory depends
+    on the distinct emojis shown, not on the number of documents. resourceCount and
+    resourceBytes tell which of them the document holds; the ones no image uses anymore are
+    released right after resizes, or by releaseUnusedResources, which scans the whole document
+    and so is never run by edits. setMaxResourceBytes caps them.
+
+    streamPlainText appends a file or an iterable of strings in chunks, converting each chunk
+    as it is appended, so large texts (log tails, chat histories) never need to be held in
+    memory whole. Asynchronously, chunks are appended from the event loop until streamFinished.
+    """
+
+    class LimitTreatment(int, Enum):
+        RemoveFirstLines = 1
+        RemoveLastLines = 2
+
+    # processed characters, total characters
+    twemojizeProgress = Signal(int, int)
+    streamFinished = Signal()
+
+    # Text read around an edit, so emojis and aliases cut by the edit are found whole.
+    # Longer than any emoji sequence (in UTF-16 code units).
+    _EMOJI_CONTEXT = 32
+
+    # Progressive mode: changes longer than a chunk are deferred, and chunks are processed
+    # until the time slice (in seconds) is over.
+    _PROGRESSIVE_CHUNK = 1024
+    _PROGRESSIVE_SLICE = 0.008
+
+    # Image name -> text it is exported as (least recently used first)
+    _OBJECT_TEXT_CACHE: OrderedDict = OrderedDict()
+
+    # Image name -> EmojiImageProvider.getPixmap arguments, None if it isn't an emoji (least recently used first)
+    _URL_ARGUMENTS_CACHE: OrderedDict = OrderedDict()
+
+    # Entries of each of these caches, shared by every document: names differ by size, margin and dpr
+    _NAME_CACHE_SIZE = 4096
+
+    # Characters read at a time by streamPlainText
+    _STREAM_CHUNK = 4096
 
     def __init__(self, parent=None, twemoji=True, alias_replacement=True, emoji_margin=1, dpr=1.0):
         super().__init__(parent)
 
         self._twemoji = False
-        self._twemoji_contents_changed_signal = None
         self._alias_replacement = False
-        self._alias_replacement_contents_changed_signal = None
         self._line_limit = 0
-        self._limit_line_signal = None
+        self._limit_treatment = self.LimitTreatment.RemoveLastLines
+        self._line_limit_slack = 0
+        # Block count as of the last line limit check
+        self._limited_block_count = 0
         self._emoji_margin = emoji_margin
         self._emoji_size = -1  # -1 means auto (based on font size)
         self._dpr = dpr
 
-        # Variable to track where the edit occurred (Optimization B)
-        self._last_change_pos = 0
+        # Automatic emoji size by font key, and the one of the current font (None until computed)
+        self._font_emoji_sizes: typing.Dict[str, int] = {}
+        self._current_emoji_size: typing.Optional[int] = None
+        # (alias, size, margin, dpr) -> image format
+        self._image_formats: typing.Dict[tuple, QTextImageFormat] = {}
+
+        # Range [start, end) changed since the last contentsChanged, in current positions
+        self._changed_range: typing.Optional[typing.Tuple[int, int]] = None
+
+        self._progressive = False
+        # Ranges left to process, as selections (they follow the edits)
+        self._pending: typing.List[QTextCursor] = []
+        self._pending_done = 0
+        self._pending_total = 0
+        self._visible_blocks: typing.Optional[typing.Tuple[int, int]] = None
+        self._progressive_timer = QTimer(self)
+        self._progressive_timer.setInterval(0)
+        self._progressive_timer.timeout.connect(self._process_pending_slice)
+
+        self._lazy = False
+        self._prefetch_blocks = 50
+        self._release_blocks = 200
+        # Converted blocks: from the block of the first cursor to the block of the second one
+        self._live: typing.Optional[typing.Tuple[QTextCursor, QTextCursor]] = None
+        self._updating_live = False
+
+        # Loaded resources: URL -> bytes
+        self._resources: typing.OrderedDict[str, int] = OrderedDict()
+        self._resource_bytes = 0
+        self._max_resource_bytes = 0
+        self._resource_sweep_timer = QTimer(self)
+        self._resource_sweep_timer.setSingleShot(True)
+        self._resource_sweep_timer.timeout.connect(self.releaseUnusedResources)
+
+        # Chunks left to append by streamPlainText (None when not streaming)
+        self._stream: typing.Optional[typing.Iterator[str]] = None
+        self._stream_undo_redo_enabled = True
+        self._stream_timer = QTimer(self)
+        self._stream_timer.setInterval(0)
+        self._stream_timer.timeout.connect(self._stream_slice)
 
         self.setTwemoji(twemoji)
         self.setAliasReplacement(alias_replacement)
 
-        # Connects the 'Change' signal (before Changed) to capture the position
+        # 'Change' (emitted before 'Changed') tells where the edit occurred.
+        # It is only emitted by documents that have a layout, so make sure there is one.
+        self.documentLayout()
         self.contentsChange.connect(self._on_contents_change)
+        self.contentsChanged.connect(self._on_contents_changed)
 
     # --- Configurations ---
 
@@ -47,16 +150,45 @@ class QTwemojiTextDocument(QTextDocument):
         return self._line_limit
 
     def setLineLimit(self, line_limit: int):
+        """
+        Limits the document to line_limit lines (0 for no limit): once an edit adds lines beyond it,
+        the lines in excess are removed as the limit treatment says, in a single removal.
+        """
         if self._line_limit == line_limit:
             return
 
+        previous_limit = self._line_limit
         self._line_limit = line_limit
 
+        if line_limit > 0 and previous_limit <= 0:
+            self.contentsChanged.connect(self._limit_line)
+        elif line_limit <= 0 and previous_limit > 0:
+            self.contentsChanged.disconnect(self._limit_line)
+
         if line_limit > 0:
-            self._limit_line_signal = self.contentsChange.connect(self._limit_line)
-        elif self._limit_line_signal:
-            self.contentsChanged.disconnect(self._limit_line_signal)
-            self._limit_line_signal = None
+            self._trim_lines(self._limit_treatment)
+
+    def limitTreatment(self) -> LimitTreatment:
+        return self._limit_treatment
+
+    def setLimitTreatment(self, limit_treatment: LimitTreatment):
+        """
+        Sets which lines go beyond the line limit: the first ones (oldest, as in a log viewer)
+        or the last ones (newest, the default).
+        """
+        self._limit_treatment = limit_treatment
+
+    def lineLimitSlack(self) -> int:
+        return self._line_limit_slack
+
+    def setLineLimitSlack(self, slack: int):
+        """
+        Removes slack more lines whenever the first lines are removed (0, the default, keeps exactly
+        lineLimit lines). Removing the first lines relayouts all the others, so with a slack, a full
+        document only pays it every slack appended lines, and has between lineLimit - slack and
+        lineLimit lines.
+        """
+        self._line_limit_slack = max(slack, 0)
 
     def twemoji(self) -> bool:
         return self._twemoji
@@ -68,12 +200,15 @@ class QTwemojiTextDocument(QTextDocument):
         self._twemoji = value
 
         if value:
-            self._twemoji_contents_changed_signal = self.contentsChanged.connect(self._twemojize)
             # On initial activation, process the entire document
-            self._twemojize_full()
-        elif self._twemoji_contents_changed_signal:
-            self.contentsChanged.disconnect(self._twemoji_contents_changed_signal)
-            self._twemoji_contents_changed_signal = None
+            if self._lazy:
+                self._live = None
+                self._update_live_blocks()
+            elif self._progressive:
+                self._defer(0, self.characterCount() - 1)
+            else:
+                self._twemojize_full()
+        else:
             self._detwemojize()
 
     def aliasReplacement(self) -> bool:
@@ -86,11 +221,100 @@ class QTwemojiTextDocument(QTextDocument):
         self._alias_replacement = value
 
         if value:
-            self._alias_replacement_contents_changed_signal = self.contentsChanged.connect(self._replace_alias)
-            self._replace_alias()
-        elif self._alias_replacement_contents_changed_signal:
-            self.contentsChanged.disconnect(self._replace_alias)
-            self._alias_replacement_contents_changed_signal = None
+            if self._lazy:
+                # Emojis as text everywhere, then as images where they are converted
+                self._replace_alias(twemoji=False)
+                self._twemojize_live()
+            elif self._progressive:
+                self._defer(0, self.characterCount() - 1)
+            else:
+                self._replace_alias()
+
+    def progressive(self) -> bool:
+        return self._progressive
+
+    def setProgressive(self, progressive: bool):
+        """
+        Enables the progressive mode: changes longer than a chunk are converted in time slices
+        from the event loop instead of within the change. Disabling it processes what is left.
+        """
+        if self._progressive == progressive:
+            return
+
+        self._progressive = progressive
+
+        if not progressive:
+            self.processPending()
+
+    def lazy(self) -> bool:
+        return self._lazy
+
+    def setLazy(self, lazy: bool):
+        """
+        Enables the lazy mode: only the blocks around the visible ones hold emoji images.
+        Nothing is converted until the visible blocks are known (see setVisibleBlocks).
+        If there is something to undo or redo, the whole document is kept converted instead.
+        """
+        if self._lazy == lazy:
+            return
+
+        self._lazy = lazy
+        self._live = None
+
+        if not self._twemoji:
+            return
+
+        if lazy:
+            if self._has_undo_history():
+                # Going back to text would be an undo step
+                self._set_live_blocks(self.firstBlock(), self.lastBlock())
+            else:
+                with self._background_edit():
+                    self._detwemojize()
+                self._update_live_blocks()
+        elif self._progressive:
+            self._defer(0, self.characterCount() - 1)
+        else:
+            with self._background_edit():
+                self._twemojize_full()
+
+    def prefetchBlocks(self) -> int:
+        return self._prefetch_blocks
+
+    def setPrefetchBlocks(self, blocks: int):
+        """Sets how many blocks before and after the visible ones are converted in lazy mode."""
+        self._prefetch_blocks = blocks
+        self._release_blocks = max(self._release_blocks, blocks)
+        self._update_live_blocks()
+
+    def releaseBlocks(self) -> int:
+        return self._release_blocks
+
+    def setReleaseBlocks(self, blocks: int):
+        """
+        Sets how far from the visible blocks (in blocks) converted blocks go back to text in
+        lazy mode. It can't be lower than the prefetch margin.
+        """
+        self._release_blocks = max(blocks, self._prefetch_blocks)
+        self._update_live_blocks()
+
+    def setVisibleBlocks(self, first: int, last: int):
+        """
+        Tells which blocks are shown (by number): the progressive mode converts them first,
+        and the lazy mode converts the blocks around them.
+        """
+        self._visible_blocks = (first, last)
+        self._update_live_blocks()
+
+    def isProcessing(self) -> bool:
+        """Whether the progressive mode has ranges left to convert."""
+        return bool(self._pending)
+
+    def processPending(self):
+        """Converts what the progressive mode has left, right away."""
+        while self._pending:
+            self._process_pending_chunk()
+        self._finish_pending()
 
     def emojiMargin(self) -> int:
         return self._emoji_margin
@@ -110,139 +334,702 @@ class QTwemojiTextDocument(QTextDocument):
         if self._emoji_size == size:
             return
         self._emoji_size = size
+        self._invalidate_emoji_size()
         if self._twemoji:
             with QSignalBlocker(self):
                 self.updateEmojiImages()
 
-    # --- Main Logic (Optimization B applied) ---
-
-    def _on_contents_change(self, position, *_):
-        """Captures the change position before it is processed."""
-        self._last_change_pos = position
-
-    def _ensure_resource_loaded(self, emoji: Emoji, size: int, margin: int):
-        """Lazy Loading via EmojiImageProvider."""
-        if not emoji:
+    # --- Main Logic ---
+
+    def _on_contents_change(self, position: int, chars_removed: int, chars_added: int):
+        """Accumulates the changed range until contentsChanged processes it."""
+        # The emoji size follows the font of the first character
+        if position == 0:
+            self._current_emoji_size = None
+        end = position + chars_added
+        if self._changed_range is not None:
+            previous_start, previous_end = self._changed_range
+            if previous_end > position:
+                previous_end = max(previous_end + chars_added - chars_removed, end)
+            position = min(position, previous_start)
+            end = max(end, previous_end)
+        self._changed_range = (position, end)
+
+    def _on_contents_changed(self):
+        """Runs the twemoji and alias passes over the changed range only."""
+        if self._changed_range is None:
             return
+        start, end = self._changed_range
+        self._changed_range = None
 
-        size_obj = QSize(size, size)
-
-        url = EmojiImageProvider.getUrl(emoji.aliases[0], margin, size_obj, self._dpr)
+        # Something left to redo means the change is an undo (or a redo with more to come):
+        # converting again would drop the redo history and make conversions impossible to undo
+        if self.availableRedoSteps():
+            return
 
-        if self.resource(QTextDocument.ResourceType.ImageResource, url):
+        if self._lazy:
+            self._process_lazy_change(start, end)
             return
 
-        pixmap = EmojiImageProvider.getPixmap(emoji, margin, size_obj, self._dpr)
+        if self._progressive and end - start > self._PROGRESSIVE_CHUNK:
+            self._defer(start, end)
+            return
 
-        if not pixmap.isNull():
-            self.addResource(QTextDocument.ResourceType.ImageResource, url, pixmap)
+        if self._twemoji:
+            end = self._twemojize(start, end)
+        if self._alias_replacement:
+            self._replace_alias(start, end)
 
-    def _calculate_emoji_size(self, cursor: QTextCursor) -> int:
-        """Calculates the emoji size based on configuration or font."""
+    def _calculate_emoji_size(self) -> int:
+        """
+        Calculates the emoji size based on configuration or font.
+        The size of each font is only computed once, and the current one is kept until the
+        first character or the default font changes.
+        """
         if self._emoji_size != -1:
             return self._emoji_size
 
-        font_height = self._font_height(cursor)
-        return int(font_height * 0.9)
-
-    def _twemojize(self):
+        if self._current_emoji_size is None:
+            font = QTextCursor(self).charFormat().font()
+            key = font.key()
+            size = self._font_emoji_sizes.get(key)
+            if size is None:
+                size = self._font_emoji_sizes[key] = int(self._font_height(font) * 0.9)
+            self._current_emoji_size = size
+        return self._current_emoji_size
+
+    def _invalidate_emoji_size(self):
+        self._font_emoji_sizes.clear()
+        self._current_emoji_size = None
+        self._image_formats.clear()
+
+    def _twemojize(self, start: int, end: int, join_previous: bool = True) -> int:
         """
-        OPTIMIZED version: Processes only the current block (paragraph).
-        Called automatically on every text change.
+        Converts the emojis overlapping the range [start, end) into images.
+        Only the range and a small context around it are read, so the cost doesn't depend
+        on the document length. Returns the end of the range after the conversion.
         """
-        # 1. Identifies the block where the edit occurred
-        block = self.findBlock(self._last_change_pos)
-        if not block.isValid():
-            return
-
-        text = block.text()
-        block_pos = block.position()
-
-        for emoji, match in self.__reverse_generator(EmojiFinder.findEmojiObjects(text, True)):
-            image_fmt = self._emoji_to_text_image(emoji)
-            self._replace_match(match, image_fmt, block_pos)
+        window_start, text, cut_left, cut_right = self._text_window(start, end, self._EMOJI_CONTEXT)
+        matches = self._matches_in_range(EmojiFinder.findEmojiObjects(text, True), start - window_start,
+                                         end - window_start, utf16_length(text), cut_left, cut_right)
+
+        replacements = []
+        for emoji, match in self.__reverse_generator(matches):
+            match_start = window_start + match.capturedStart(0)
+            match_end = window_start + match.capturedEnd(0)
+            replacements.append((match_start, match_end, self._emoji_to_text_image(emoji)))
+            # The whole sequence becomes a single object replacement character
+            end = end - (match_end - match_start - 1) if match_end <= end else match_start + 1
+        # Part of the edit that triggered it by default: undone together
+        self._replace_all(replacements, join_previous)
+        return end
 
     def _twemojize_full(self):
         """Full version for use at initialization (total scan)."""
-        for emoji, match in self.__reverse_generator(EmojiFinder.findEmojiObjects(super().toPlainText(), True)):
-            image_fmt = self._emoji_to_text_image(emoji)
-            self._replace_match(match, image_fmt)
+        self._replace_all((match.capturedStart(0), match.capturedEnd(0), self._emoji_to_text_image(emoji))
+                          for emoji, match in self.__reverse_generator(
+                              EmojiFinder.findEmojiObjects(super().toPlainText(), True)))
 
     def updateEmojiImages(self):
-        """Updates the margin and size of existing emoji images without converting to text."""
-        for block in self.__reverse_generator(self._blocks()):
-            for fragment in self.__reverse_generator(self.emoji_fragments(block)):
-                emoji = self._text_image_to_emoji(fragment.charFormat().toImageFormat())
-                new_img_fmt = self._emoji_to_text_image(emoji)
-                self._replace_match(fragment, new_img_fmt)
-
-    def _replace_alias(self):
         """
-        Alias replacement - :smile: -> 😄
-        Could also be optimized for _last_change_pos, but alias is less frequent.
-        Kept global logic for safety, or the same logic as _twemojize could be applied.
+        Updates the margin and size of existing emoji images without converting to text.
+        The formats are changed in place, a run of identical images at once, and the new format
+        is built once per distinct image.
         """
-        for emoji, match in self.__reverse_generator(EmojiFinder.findEmojiAliases(super().toPlainText())):
-            if self._twemoji:
-                image_fmt = self._emoji_to_text_image(emoji)
-                self._replace_match(match, image_fmt)
+        # Runs of identical images: [start, end) and image name
+        runs: typing.List[typing.List] = []
+        for position, char_format in self._objects():
+            name = char_format.stringProperty(QTextFormat.Property.ImageName)
+            if not name.startswith("twemoji:"):
+                continue
+            if runs and runs[-1][1] == position and runs[-1][2] == name:
+                runs[-1][1] += 1
             else:
-                self._replace_match(match, emoji.emoji)
+                runs.append([position, position + 1, name])
+        if not runs:
+            return
 
-    def _replace_match(self, match: typing.Union[QRegularExpressionMatch, QTextFragment],
-                       content: typing.Union[str, QTextImageFormat], offset: int = 0):
+        # Image name -> its new format
+        formats: typing.Dict[str, typing.Optional[QTextImageFormat]] = {}
         cursor = QTextCursor(self)
+        with QSignalBlocker(self):
+            cursor.beginEditBlock()
+            for start, end, name in runs:
+                if name not in formats:
+                    emoji = EmojiResolver.byAlias(QUrl(name).path())
+                    formats[name] = self._emoji_to_text_image(emoji) if emoji else None
+                image_format = formats[name]
+                if image_format is None:
+                    continue
+                cursor.setPosition(start)
+                cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+                cursor.mergeCharFormat(image_format)
+            cursor.endEditBlock()
+        # The previous sizes are now unused
+        self._schedule_resource_sweep()
+
+    def _replace_alias(self, start: typing.Optional[int] = None, end: typing.Optional[int] = None,
+                       join_previous: typing.Optional[bool] = None,
+                       twemoji: typing.Optional[bool] = None) -> typing.Optional[int]:
+        """
+        Alias replacement - :smile: -> 😄
+        Replaces the aliases overlapping the range [start, end) (reading only the range and
+        the length of the longest alias around it), or the whole document by default.
+        Aliases become images if twemoji (the document setting by default), else emojis as text.
+        Returns the end of the range after the replacement.
+        """
+        if twemoji is None:
+            twemoji = self._twemoji
 
-        start = match.position() if isinstance(match, QTextFragment) else match.capturedStart(0)
-        end = match.position() + match.length() if isinstance(match, QTextFragment) else match.capturedEnd(0)
+        if start is None:
+            offset = 0
+            matches = EmojiFinder.findEmojiAliases(super().toPlainText())
+        else:
+            offset, text, cut_left, cut_right = self._text_window(start, end, EmojiFinder.maxAliasLength())
+            matches = self._matches_in_range(EmojiFinder.findEmojiAliases(text), start - offset, end - offset,
+                                             utf16_length(text), cut_left, cut_right)
+
+        replacements = []
+        for emoji, match in self.__reverse_generator(matches):
+            match_start = offset + match.capturedStart(0)
+            match_end = offset + match.capturedEnd(0)
+            content = self._emoji_to_text_image(emoji) if twemoji else emoji.emoji
+            replacements.append((match_start, match_end, content))
+            if end is not None:
+                length = 1 if twemoji else utf16_length(content)
+                end = end - (match_end - match_start - length) if match_end <= end else match_start + length
+        self._replace_all(replacements, start is not None if join_previous is None else join_previous)
+        return end
+
+    def _text_window(self, start: int, end: int, context: int) -> typing.Tuple[int, str, bool, bool]:
+        """
+        Returns the text of the range [start - context, end + context) clamped to the
+        document: its start, its text (one character per document position) and whether it
+        was cut on the left and on the right.
+        """
+        last = self.characterCount() - 1
+        window_start = max(start - context, 0)
+        window_end = min(end + context, last)
+        # Halves of a surrogate pair would be dropped from the text, shifting the positions
+        if window_start > 0 and '\udc00' <= self.characterAt(window_start) <= '\udfff':
+            window_start -= 1
+        if window_end < last and '\ud800' <= self.characterAt(window_end - 1) <= '\udbff':
+            window_end += 1
 
-        cursor.setPosition(start + offset)
-        cursor.setPosition(end + offset, QTextCursor.MoveMode.KeepAnchor)
+        cursor = QTextCursor(self)
+        cursor.setPosition(window_start)
+        cursor.setPosition(max(window_end, window_start), QTextCursor.MoveMode.KeepAnchor)
+        return window_start, cursor.selectedText(), window_start > 0, window_end < last
 
+    @staticmethod
+    def _matches_in_range(matches: typing.Iterable[typing.Tuple[Emoji, QRegularExpressionMatch]],
+                          start: int, end: int, length: int, cut_left: bool, cut_right: bool
+                          ) -> typing.Generator[typing.Tuple[Emoji, QRegularExpressionMatch], None, None]:
+        """
+        Keeps the matches overlapping [start, end). Matches touching a cut edge of the text
+        window are dropped, as they may be part of a longer sequence.
+        """
+        for emoji, match in matches:
+            match_start = match.capturedStart(0)
+            match_end = match.capturedEnd(0)
+            if match_start > end or match_end < start:
+                continue
+            if (cut_left and match_start == 0) or (cut_right and match_end == length):
+                continue
+            yield emoji, match
+
+    def _replace_all(self, replacements: typing.Iterable[typing.Tuple[int, int, typing.Union[str, QTextImageFormat]]],
+                     join_previous: bool = False):
+        """
+        Replaces each range [start, end) by an image or a text, given from the last range to
+        the first one so positions stay valid. Everything is done with one cursor inside one
+        edit block: a single undo step (joined to the previous one if join_previous) and a
+        single relayout.
+        """
+        cursor = None
         with QSignalBlocker(self):
-            if isinstance(content, QTextImageFormat):
-                cursor.removeSelectedText()
-                cursor.insertImage(content)
+            for start, end, content in replacements:
+                if cursor is None:
+                    cursor = QTextCursor(self)
+                    if join_previous:
+                        cursor.joinPreviousEditBlock()
+                    else:
+                        cursor.beginEditBlock()
+
+                cursor.setPosition(start)
+                cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+                if isinstance(content, QTextImageFormat):
+                    cursor.insertImage(content)
+                else:
+                    cursor.insertText(content, self._text_format(cursor.charFormat()))
+
+            if cursor is not None:
+                cursor.endEditBlock()
+
+    # --- Progressive Mode ---
+
+    def _defer(self, start: int, end: int):
+        """Queues the range [start, end) for the progressive mode."""
+        end = min(end, self.characterCount() - 1)
+        cursor = QTextCursor(self)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        self._pending.append(cursor)
+        self._pending_total += end - start
+        self._progressive_timer.start()
+        self.twemojizeProgress.emit(self._pending_done, self._pending_total)
+
+    def _process_pending_slice(self):
+        deadline = time.perf_counter() + self._PROGRESSIVE_SLICE
+        while self._pending and time.perf_counter() < deadline:
+            self._process_pending_chunk()
+
+        if self._pending:
+            self.twemojizeProgress.emit(min(self._pending_done, self._pending_total), self._pending_total)
+        else:
+            self._finish_pending()
+
+    def _finish_pending(self):
+        self._progressive_timer.stop()
+        if self._pending_total:
+            self.twemojizeProgress.emit(self._pending_total, self._pending_total)
+        self._pending_done = self._pending_total = 0
+
+    def _process_pending_chunk(self):
+        """Converts a chunk of the first pending range showing a visible block (or of the first one)."""
+        index, chunk_start = self._next_pending_chunk()
+        pending = self._pending.pop(index)
+        start, end = pending.selectionStart(), pending.selectionEnd()
+        chunk_start = max(start, min(chunk_start, end))
+        chunk_end = min(chunk_start + self._PROGRESSIVE_CHUNK, end)
+
+        # What's left on both sides, as selections that follow the conversion of the chunk
+        for left_start, left_end in ((chunk_end, end), (start, chunk_start)):
+            if left_end > left_start:
+                cursor = QTextCursor(self)
+                cursor.setPosition(left_start)
+                cursor.setPosition(left_end, QTextCursor.MoveMode.KeepAnchor)
+                self._pending.insert(index, cursor)
+        self._pending_done += chunk_end - chunk_start
+
+        # Part of the edit that deferred it: joined to its edit block, so e.g. a paste is still
+        # undone at once (unless there is no undo history, which it is kept out of)
+        join_previous = self._has_undo_history()
+        with self._background_edit():
+            if self._twemoji and chunk_end > chunk_start:
+                chunk_end = self._twemojize(chunk_start, chunk_end, join_previous=join_previous)
+            if self._alias_replacement and chunk_end > chunk_start:
+                self._replace_alias(chunk_start, chunk_end, join_previous=join_previous)
+
+    def _next_pending_chunk(self) -> typing.Tuple[int, int]:
+        """Returns the index of the pending range to process next and where to start in it."""
+        if self._visible_blocks is not None:
+            first = self.findBlockByNumber(self._visible_blocks[0])
+            last = self.findBlockByNumber(self._visible_blocks[1])
+            if first.isValid():
+                if not last.isValid():
+                    last = self.lastBlock()
+                visible_start = first.position()
+                visible_end = last.position() + last.length() - 1
+                for index, pending in enumerate(self._pending):
+                    if pending.selectionStart() < visible_end and pending.selectionEnd() > visible_start:
+                        return index, visible_start
+        return 0, self._pending[0].selectionStart()
+
+    def _has_undo_history(self) -> bool:
+        return self.isUndoAvailable() or self.isRedoAvailable()
+
+    @contextlib.contextmanager
+    def _background_edit(self):
+        """
+        For conversions that aren't part of any edit: they are recorded as usual, unless there
+        is nothing to undo (e.g. right after setPlainText), where they can't be undone either:
+        then they are kept out of the undo history and don't modify the document.
+        """
+        if self._has_undo_history():
+            yield
+            return
+
+        undo_redo_enabled = self.isUndoRedoEnabled()
+        modified = self.isModified()
+        self.setUndoRedoEnabled(False)
+        try:
+            yield
+        finally:
+            self.setUndoRedoEnabled(undo_redo_enabled)
+            self.setModified(modified)
+
+    # --- Lazy Mode ---
+
+    def _process_lazy_change(self, start: int, end: int):
+        """Aliases are replaced by emojis as text, which only become images within the converted blocks."""
+        if self._alias_replacement:
+            end = self._replace_alias(start, end, twemoji=False)
+        if self._twemoji and self._live is not None:
+            start = max(start, self._live[0].position())
+            end = min(end, self._live[1].position())
+            if end > start:
+                self._twemojize(start, end)
+
+    def _twemojize_live(self):
+        if self._twemoji and self._live is not None:
+            with self._background_edit():
+                self._twemojize(self._live[0].position(), self._live[1].position(), join_previous=False)
+
+    def _update_live_blocks(self):
+        """Converts the blocks within the prefetch margin and releases the ones beyond the release distance."""
+        # With something to undo or redo, they would be undo steps (or drop the redo history)
+        if not self._lazy or not self._twemoji or self._visible_blocks is None or self._has_undo_history():
+            return
+        # The view may report its visible blocks again as the conversion changes the layout
+        if self._updating_live:
+            return
+        self._updating_live = True
+        try:
+            self._update_live_block_range()
+        finally:
+            self._updating_live = False
+
+    def _update_live_block_range(self):
+        last_number = self.blockCount() - 1
+        first = max(0, min(self._visible_blocks[0], last_number))
+        last = max(first, min(self._visible_blocks[1], last_number))
+        window_first = max(first - self._prefetch_blocks, 0)
+        window_last = min(last + self._prefetch_blocks, last_number)
+        keep_first = max(first - self._release_blocks, 0)
+        keep_last = min(last + self._release_blocks, last_number)
+
+        with self._background_edit():
+            if self._live is None:
+                live_first, live_last = window_first, window_last
+                self._convert_blocks(live_first, live_last)
             else:
-                cursor.insertText(content)
+                live_first = self._live[0].block().blockNumber()
+                live_last = self._live[1].block().blockNumber()
+                if live_last < keep_first or live_first > keep_last:
+                    # Scrolled far away: nothing to keep
+                    self._release_block_range(live_first, live_last)
+                    live_first, live_last = window_first, window_last
+                    self._convert_blocks(live_first, live_last)
+                else:
+                    if window_first < live_first:
+                        self._convert_blocks(window_first, live_first - 1)
+                        live_first = window_first
+                    if window_last > live_last:
+                        self._convert_blocks(live_last + 1, window_last)
+                        live_last = window_last
+                    if live_first < keep_first:
+                        self._release_block_range(live_first, keep_first - 1)
+                        live_first = keep_first
+                    if live_last > keep_last:
+                        self._release_block_range(keep_last + 1, live_last)
+                        live_last = keep_last
+
+        self._set_live_blocks(self.findBlockByNumber(live_first), self.findBlockByNumber(live_last))
+
+    def _set_live_blocks(self, first_block: QTextBlock, last_block: QTextBlock):
+        live_start = QTextCursor(first_block)
+        # Text typed at the start of the converted blocks is part of them
+        live_start.setKeepPositionOnInsert(True)
+        live_end = QTextCursor(last_block)
+        live_end.movePosition(QTextCursor.MoveOperation.EndOfBlock)
+        self._live = (live_start, live_end)
+
+    def _convert_blocks(self, first: int, last: int):
+        first_block = self.findBlockByNumber(first)
+        last_block = self.findBlockByNumber(last)
+        self._twemojize(first_block.position(), last_block.position() + last_block.length() - 1, join_previous=False)
+
+    def _release_block_range(self, first: int, last: int):
+        """Converts the emoji images of the blocks back to text."""
+        self._replace_all((position, position + 1, emoji.emoji)
+                          for position, emoji in self.__reverse_generator(
+                              self._emoji_positions(self.findBlockByNumber(first), self.findBlockByNumber(last))))
+
+    # --- Streaming ---
+
+    def streamPlainText(self, source: typing.Union[str, os.PathLike, typing.Iterable[str]],
+                        chunk_size: typing.Optional[int] = None, asynchronous: bool = False):
+        """
+        Appends the text of a file (path, read as UTF-8) or of an iterable of strings (e.g. an open
+        file or a generator) in chunks of about chunk_size characters, each one converted as it is
+        appended. Chunks end at line breaks (or spaces) when possible, so emojis and aliases aren't cut.
+        With a line limit, the lines beyond it are removed as the limit treatment says: the oldest
+        ones as new ones arrive, or the new ones, the stream then finishing once the document is full.
+        Like setPlainText, it can't be undone (and clears the undo history).
+        Asynchronously, chunks are appended in time slices from the event loop; streamFinished
+        is emitted once everything was appended. A stream in progress is cancelled first.
+        """
+        self.cancelStream()
+        self._stream = self._cut_chunks(self._read_chunks(source, chunk_size or self._STREAM_CHUNK))
+        self._stream_undo_redo_enabled = self.isUndoRedoEnabled()
+        self.setUndoRedoEnabled(False)
+        if asynchronous:
+            self._stream_timer.start()
+        else:
+            for chunk in self._stream:
+                if not self._append_chunk(chunk):
+                    break
+            if self._stream is not None:
+                self._finish_stream()
+
+    def isStreaming(self) -> bool:
+        """Whether an asynchronous streamPlainText has chunks left to append."""
+        return self._stream is not None
+
+    def cancelStream(self):
+        """Stops an asynchronous streamPlainText, keeping what was appended (streamFinished isn't emitted)."""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream_timer.stop()
+            self._stream = None
+            self.setUndoRedoEnabled(self._stream_undo_redo_enabled)
+
+    def _stream_slice(self):
+        deadline = time.perf_counter() + self._PROGRESSIVE_SLICE
+        for chunk in self._stream:
+            if not self._append_chunk(chunk):
+                break
+            if time.perf_counter() >= deadline:
+                return
+        # Unless it was cancelled meanwhile
+        if self._stream is not None:
+            self._finish_stream()
+
+    def _finish_stream(self):
+        # Closes the file when the document got full before its end
+        self._stream.close()
+        self._stream_timer.stop()
+        self._stream = None
+        self.setUndoRedoEnabled(self._stream_undo_redo_enabled)
+        self.streamFinished.emit()
+
+    def _append_chunk(self, chunk: str) -> bool:
+        """
+        Appends the chunk (converted by the change handling) and removes the lines beyond the limit.
+        Returns whether the next chunks can be kept, i.e. not once the last lines were removed.
+        """
+        cursor = QTextCursor(self)
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(chunk)
+        trimmed = self._trim_lines(self._limit_treatment)
+        return not trimmed or self._limit_treatment == self.LimitTreatment.RemoveFirstLines
+
+    @staticmethod
+    def _read_chunks(source: typing.Union[str, os.PathLike, typing.Iterable[str]],
+                     chunk_size: int) -> typing.Generator[str, None, None]:
+        if isinstance(source, (str, os.PathLike)):
+            # Closing the generator (cancelStream) closes the file
+            with open(source, encoding="utf-8") as file:
+                yield from iter(lambda: file.read(chunk_size), "")
+            return
+
+        buffer = []
+        length = 0
+        for text in source:
+            buffer.append(text)
+            length += len(text)
+            if length >= chunk_size:
+                yield "".join(buffer)
+                buffer.clear()
+                length = 0
+        if buffer:
+            yield "".join(buffer)
+
+    @staticmethod
+    def _cut_chunks(chunks: typing.Iterable[str]) -> typing.Generator[str, None, None]:
+        """Moves what follows the last line break (or space) of each chunk to the next one."""
+        rest = ""
+        for chunk in chunks:
+            chunk = rest + chunk
+            cut = chunk.rfind("\n") + 1 or chunk.rfind(" ") + 1 or len(chunk)
+            rest = chunk[cut:]
+            yield chunk[:cut]
+        if rest:
+            yield rest
+
+    # --- Resources ---
+
+    def resourceCount(self) -> int:
+        """Number of emoji resources the document holds (the ones no longer used go on the next release)."""
+        return len(self._resources)
+
+    def resourceBytes(self) -> int:
+        """Memory of the pixmaps of those resources, shared with the pixmap cache and the other documents."""
+        return self._resource_bytes
+
+    def maxResourceBytes(self) -> int:
+        return self._max_resource_bytes
+
+    def setMaxResourceBytes(self, max_bytes: int):
+        """
+        Caps resourceBytes (0, the default, means no cap): the document releases the least recently
+        loaded pixmaps first, and loads them again from the shared cache if they are painted.
+        A pixmap's memory is freed once the shared cache evicted it too (see EmojiImageProvider.cache).
+        """
+        self._max_resource_bytes = max(max_bytes, 0)
+        self._trim_resources()
+
+    def releaseUnusedResources(self) -> int:
+        """Releases the emoji resources no image of the document uses anymore. Returns how many."""
+        self._resource_sweep_timer.stop()
+        if not self._resources:
+            return 0
+
+        used = {char_format.stringProperty(QTextFormat.Property.ImageName) for _, char_format in self._objects()}
+        unused = [key for key in self._resources if key not in used]
+        for key in unused:
+            self._release_resource(key)
+        return len(unused)
+
+    def loadResource(self, resource_type: int, name: QUrl):
+        # Emoji pixmaps are resolved from the pixmap cache shared by every document. Added to the
+        # document (a reference, QPixmap being implicitly shared), so later paints stay in Qt
+        if resource_type == QTextDocument.ResourceType.ImageResource and name.scheme() == "twemoji":
+            pixmap = self._emoji_pixmap(name)
+            if pixmap is not None:
+                self.addResource(QTextDocument.ResourceType.ImageResource, name, pixmap)
+                key = name.toString()
+                size = pixmap.width() * pixmap.height() * pixmap.depth() // 8
+                self._resource_bytes += size - self._resources.get(key, 0)
+                self._resources[key] = size
+                self._resources.move_to_end(key)
+                self._trim_resources()
+                return pixmap
+        return super().loadResource(resource_type, name)
+
+    @classmethod
+    def _emoji_pixmap(cls, url: QUrl) -> typing.Optional[QPixmap]:
+        arguments = cls._cached(cls._URL_ARGUMENTS_CACHE, url.toString(), cls._url_arguments)
+        if arguments is None:
+            return None
+        pixmap = EmojiImageProvider.getPixmap(*arguments)
+        return None if pixmap.isNull() else pixmap
+
+    @staticmethod
+    def _url_arguments(name: str) -> typing.Optional[tuple]:
+        parsed = EmojiImageProvider.parseUrl(QUrl(name))
+        emoji = EmojiResolver.byAlias(parsed[0]) if parsed else None
+        return (emoji, *parsed[1:]) if emoji else None
+
+    @classmethod
+    def _cached(cls, cache: OrderedDict, key: str, compute: typing.Callable[[str], T]) -> T:
+        """Returns the value of the key in the cache, computed on a miss. The least recently used entries are dropped."""
+        try:
+            cache.move_to_end(key)
+            return cache[key]
+        except KeyError:
+            value = cache[key] = compute(key)
+            while len(cache) > cls._NAME_CACHE_SIZE:
+                cache.popitem(last=False)
+            return value
+
+    def _trim_resources(self):
+        # The most recently loaded one is kept, whatever its size
+        while self._max_resource_bytes and self._resource_bytes > self._max_resource_bytes \
+                and len(self._resources) > 1:
+            self._release_resource(next(iter(self._resources)))
+
+    def _release_resource(self, key: str):
+        # An invalid resource: Qt falls back to loadResource if it is needed again
+        self.addResource(QTextDocument.ResourceType.ImageResource, QUrl(key), None)
+        self._resource_bytes -= self._resources.pop(key)
+
+    def _schedule_resource_sweep(self):
+        if self._resources:
+            self._resource_sweep_timer.start(0)
 
     # --- Helpers and Utilities ---
 
-    def _limit_line(self, *_):
-        if self._line_limit <= 0:
+    def _limit_line(self):
+        """Trims the lines beyond the limit, only checked when the block count grew."""
+        block_count = self.blockCount()
+        grew = block_count > self._limited_block_count
+        self._limited_block_count = block_count
+        # Streamed chunks are limited as they are appended, and lines restored by an undo stay for the redo
+        if not grew or block_count <= self._line_limit or self._stream is not None or self.availableRedoSteps():
             return
+        self._trim_lines(self._limit_treatment)
 
-        if self.blockCount() > self._line_limit:
-            cursor = QTextCursor(self)
-            cursor.movePosition(QTextCursor.MoveOperation.End)
-            with QSignalBlocker(self):
-                while self.blockCount() > self._line_limit:
-                    cursor.select(QTextCursor.SelectionType.BlockUnderCursor)
-                    cursor.removeSelectedText()
-                    cursor.deletePreviousChar()
+    def _trim_lines(self, limit_treatment: LimitTreatment) -> bool:
+        """Removes the lines beyond the limit as a single range, within one edit block. Returns whether there were any."""
+        excess = self.blockCount() - self._line_limit
+        if self._line_limit <= 0 or excess <= 0:
+            return False
+
+        cursor = QTextCursor(self)
+        if limit_treatment == self.LimitTreatment.RemoveFirstLines:
+            excess = min(excess + self._line_limit_slack, self.blockCount() - 1)
+            cursor.setPosition(self.findBlockByNumber(excess).position(), QTextCursor.MoveMode.KeepAnchor)
+        else:
+            # From the end of the last line kept, with the line break that follows it
+            last_kept = self.findBlockByNumber(self._line_limit - 1)
+            cursor.setPosition(last_kept.position() + last_kept.length() - 1)
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.beginEditBlock()
+        cursor.removeSelectedText()
+        cursor.endEditBlock()
+        self._limited_block_count = self.blockCount()
+        return True
 
     def toPlainText(self) -> str:
-        return self._to_plain_text()
+        return self._to_plain_text(0, self.characterCount() - 1)
 
-    def _to_plain_text(self, first_block: typing.Optional[QTextBlock] = None,
-                       last_block: typing.Optional[QTextBlock] = None,
-                       selection_cursor: typing.Optional[QTextCursor] = None) -> str:
-        result = ""
-        for block in self._blocks(first_block, last_block):
-            for frag in self._fragments(block):
-                if selection_cursor and not self._is_fragment_selected(selection_cursor, frag):
-                    continue
+    def _to_plain_text(self, start: int, end: int) -> str:
+        """
+        Returns the text of the range [start, end) with the emoji images as emojis.
+        The text is taken from Qt in one piece and only its object replacement characters
+        are looked up, so the cost is linear and doesn't depend on the fragments.
+        """
+        pieces, positions = self._split_objects(start, end)
+        # Looks the format up in the document, unlike a cursor that would lay the block out
+        layout = self.documentLayout()
+        result = [pieces[0]]
+        for position, piece in zip(positions, pieces[1:]):
+            result.append(self._object_text(layout.format(position)))
+            result.append(piece)
+        return "".join(result).replace('\u2029', '\n')
+
+    def _split_objects(self, start: int, end: int) -> typing.Tuple[typing.List[str], typing.List[int]]:
+        """
+        Returns the text of the range [start, end) split on its object replacement characters,
+        and the position of each of them.
+        """
+        cursor = QTextCursor(self)
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        pieces = cursor.selectedText().split('\ufffc')
+
+        # A range starting in the middle of a surrogate pair loses that half
+        position = start + 1 if start > 0 and '\udc00' <= self.characterAt(start) <= '\udfff' else start
+        positions = []
+        for piece in pieces[:-1]:
+            position += utf16_length(piece)
+            positions.append(position)
+            position += 1
+        return pieces, positions
+
+    def _objects(self, start: int = 0, end: typing.Optional[int] = None
+                 ) -> typing.Generator[typing.Tuple[int, QTextCharFormat], None, None]:
+        """Yields the position and the format of every object (e.g. image) of the range, in document order."""
+        if end is None:
+            end = self.characterCount() - 1
+        layout = self.documentLayout()
+        for position in self._split_objects(start, end)[1]:
+            yield position, layout.format(position)
+
+    @classmethod
+    def _object_text(cls, char_format: QTextCharFormat) -> str:
+        """Returns the emoji of an emoji image; other objects are kept as they are."""
+        return cls._cached(cls._OBJECT_TEXT_CACHE, char_format.stringProperty(QTextFormat.Property.ImageName),
+                           cls._name_text)
 
-                if self._is_emoji_frag(frag):
-                    image_format = frag.charFormat().toImageFormat()
-                    emoji = self._text_image_to_emoji(image_format)
-                    if emoji:
-                        result += emoji.emoji
-                else:
-                    result += frag.text()
-            if block != self.lastBlock():
-                result += '\n'
-        return result
+    @staticmethod
+    def _name_text(name: str) -> str:
+        if name.startswith("twemoji:"):
+            emoji = EmojiResolver.byAlias(QUrl(name).path())
+            return emoji.emoji if emoji else ""
+        return '\ufffc'
 
     # --- Regex and Color Helpers ---
 
@@ -281,29 +1068,62 @@ class QTwemojiTextDocument(QTextDocument):
         return False
 
     def _detwemojize(self):
-        for block in self.__reverse_generator(self._blocks()):
-            for fragment in self.__reverse_generator(self.emoji_fragments(block)):
+        self._replace_all((position, position + 1, emoji.emoji)
+                          for position, emoji in self.__reverse_generator(self._emoji_positions()))
+        self._schedule_resource_sweep()
+
+    def _emoji_positions(self, first_block: typing.Optional[QTextBlock] = None,
+                         last_block: typing.Optional[QTextBlock] = None
+                         ) -> typing.Generator[typing.Tuple[int, Emoji], None, None]:
+        """
+        Yields the position and the emoji of every emoji image (of the blocks), in document order.
+        Adjacent identical images are merged in a single fragment, so a fragment may hold several.
+        """
+        for block in self._blocks(first_block, last_block):
+            for fragment in self.emoji_fragments(block):
                 emoji = self._text_image_to_emoji(fragment.charFormat().toImageFormat())
-                self._replace_match(fragment, emoji.emoji)
+                if emoji is None:
+                    continue
+                position = fragment.position()
+                for offset in range(fragment.length()):
+                    yield position + offset, emoji
+
+    @staticmethod
+    def _text_format(char_format: QTextCharFormat) -> QTextCharFormat:
+        """Returns the char format without its image properties, to insert text where an image was."""
+        text_format = QTextCharFormat(char_format)
+        text_format.setObjectType(QTextFormat.ObjectTypes.NoObject)
+        for image_property in (QTextFormat.Property.ImageName, QTextFormat.Property.ImageWidth,
+                               QTextFormat.Property.ImageHeight, QTextFormat.Property.ImageQuality):
+            text_format.clearProperty(image_property)
+        text_format.setVerticalAlignment(QTextCharFormat.VerticalAlignment.AlignNormal)
+        return text_format
 
     @staticmethod
-    def __reverse_generator(generator: typing.Generator[T, None, None]) -> typing.List[T]:
-        result = []
-        for item in generator:
-            result.insert(0, item)
+    def __reverse_generator(generator: typing.Iterable[T]) -> typing.List[T]:
+        result = list(generator)
+        result.reverse()
         return result
 
     @staticmethod
-    def _font_height(cursor: QTextCursor):
-        font = cursor.charFormat().font()
+    def _font_height(font: QFont):
         fm = QFontMetrics(font)
         return fm.height()
 
     def _emoji_to_text_image(self, emoji: Emoji) -> QTextImageFormat:
-        cursor = QTextCursor(self)
-        emoji_size = self._calculate_emoji_size(cursor)
+        """Returns the image format of the emoji, built once per alias, size, margin and device pixel ratio."""
+        emoji_size = self._calculate_emoji_size()
+        if not (emoji and emoji.aliases):
+            return QTextImageFormat()
+
+        key = (emoji.aliases[0], emoji_size, self._emoji_margin, self._dpr)
+        image = self._image_formats.get(key)
+        if image is None:
+            image = self._image_formats[key] = self._build_text_image(emoji, emoji_size)
+        return image
+
+    def _build_text_image(self, emoji: Emoji, emoji_size: int) -> QTextImageFormat:
         size = QSize(emoji_size, emoji_size)
-        self._ensure_resource_loaded(emoji, emoji_size, self._emoji_margin)
         image = QTextImageFormat()
         if emoji and emoji.aliases:
             url = EmojiImageProvider.getUrl(emoji.aliases[0], self._emoji_margin, size, self._dpr)
@@ -318,36 +1138,29 @@ class QTwemojiTextDocument(QTextDocument):
     @staticmethod
     def _text_image_to_emoji(image: QTextImageFormat) -> typing.Optional[Emoji]:
         url = QUrl(image.name())
-        return get_emoji_by_alias(url.path())
-
-    @staticmethod
-    def _is_fragment_selected(cursor: QTextCursor, fragment: QTextFragment) -> bool:
-        if not cursor.hasSelection():
-            return False
-        sel_start = cursor.selectionStart()
-        sel_end = cursor.selectionEnd()
-        frag_start = fragment.position()
-        frag_end = frag_start + fragment.length()
-        return sel_end > frag_start and sel_start < frag_end
+        return EmojiResolver.byAlias(url.path())
 
     def setDefaultFont(self, font: QFont) -> None:
         """Override setDefaultFont to trigger emoji resize when font changes."""
         super().setDefaultFont(font)
+        self._invalidate_emoji_size()
         if self._twemoji and self._emoji_size == -1:
             # We reuse updateEmojiImages logic which recalculates size based on font
             with QSignalBlocker(self):
                 self.updateEmojiImages()
 
-    def selectionToPlainText(self, cursor: QTextCursor) -> typing.Optional[str]:
-        first_block = self.findBlock(cursor.selectionStart())
-        last_block = self.findBlock(cursor.selectionEnd())
-        return self._to_plain_text(first_block, last_block, cursor)
-
     def setPlainText(self, text, /):
+        # The passes run within the change; like setPlainText itself, they can't be undone
+        undo_redo_enabled = self.isUndoRedoEnabled()
+        self.setUndoRedoEnabled(False)
+        # The previous text is gone, and so is what was left of it to convert
+        self._pending.clear()
+        self._pending_done = self._pending_total = 0
+        self._live = None
         super().setPlainText(text)
-        if self._twemoji:
-            self._twemojize_full()
-        else:
-            self._detwemojize()
-        if self._alias_replacement:
-            self._replace_alias()
+        self._update_live_blocks()
+        self.setUndoRedoEnabled(undo_redo_enabled)
+
+    def selectionToPlainText(self, cursor: QTextCursor) -> typing.Optional[str]:
+        return self._to_plain_text(cursor.selectionStart(), cursor.selectionEnd())
+
@@ -1,17 +1,45 @@
+import atexit
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
 import typing
+import zlib
+from array import array
+from collections import OrderedDict
+from enum import Enum
+from importlib import metadata
 
-from PySide6.QtCore import QRegularExpression, QSize, QRegularExpressionMatch, QUrl, QUrlQuery
-from PySide6.QtGui import QPixmap, QPixmapCache, QImageReader, Qt, QPainter
-from emojis.db import Emoji, get_emoji_by_alias, get_emoji_by_code
+from PySide6.QtCore import (QRegularExpression, QSize, QRect, QRectF, QPoint, QMargins, QRegularExpressionMatch,
+                            QUrl, QUrlQuery, QObject, Signal, QRunnable, QThreadPool, QThread)
+from PySide6.QtGui import QPixmap, QImageReader, Qt, QPainter, QImage
+from PySide6.QtSvg import QSvgRenderer
+from shiboken6 import Shiboken
+from emojis.db import Emoji
+from emojis.db.db import EMOJI_DB
 from twemoji_api.api import get_emoji_path
 
+T = typing.TypeVar('T')
+
 
 class EmojiFinder:
     """
     Utility class for finding emojis in text using PySide6's QRegularExpression.
     Centralizes the regex pattern logic used across the library.
+
+    findEmojiObjects can alternatively run on a pure-Python trie (see EmojiTrie),
+    selected with setEngine.
     """
 
+    class Engine(int, Enum):
+        Regex = 1
+        Trie = 2
+
+    _engine = Engine.Regex
+
     # Regex pattern for a single emoji (based on unicode.org specs)
     # Covers: Tag sequences, Keycap sequences, Regional indicator sequences, Extended Pictographic sequences
     _EMOJI_PATTERN = (
@@ -25,6 +53,23 @@ class EmojiFinder:
 
     _COLOR_PATTERN = R"[\x{1F3FB}-\x{1F3FF}]"
 
+    # Compiled patterns shared by the whole process, see _compiledRegex
+    _REGEX_CACHE: typing.Dict[str, QRegularExpression] = {}
+
+    _max_alias_length: typing.Optional[int] = None
+
+    _COLORS = "".join(chr(code) for code in range(0x1F3FB, 0x1F400))
+    _REMOVE_COLORS_TABLE = str.maketrans("", "", _COLORS)
+
+    @classmethod
+    def engine(cls) -> Engine:
+        return cls._engine
+
+    @classmethod
+    def setEngine(cls, engine: Engine):
+        """Selects the engine used by findEmojiObjects."""
+        cls._engine = engine
+
     @classmethod
     def getEmojiPattern(cls) -> str:
         """Returns the raw regex pattern string for a single emoji."""
@@ -32,20 +77,54 @@ class EmojiFinder:
 
     @classmethod
     def getRegex(cls) -> QRegularExpression:
-        """Returns a compiled QRegularExpression for finding emojis."""
-        return QRegularExpression(
+        """Returns the shared, precompiled QRegularExpression for finding emojis."""
+        return cls._compiledRegex(
+            "emoji",
             cls._EMOJI_PATTERN,
             QRegularExpression.PatternOption.UseUnicodePropertiesOption
         )
 
+    @classmethod
+    def getAliasRegex(cls) -> QRegularExpression:
+        """Returns the shared, precompiled QRegularExpression for finding aliases (:alias:)."""
+        return cls._compiledRegex("alias", cls._ALIAS_PATTERN)
+
+    @classmethod
+    def getColorRegex(cls) -> QRegularExpression:
+        """Returns the shared, precompiled QRegularExpression for finding skin tone modifiers."""
+        return cls._compiledRegex("color", cls._COLOR_PATTERN)
+
+    @classmethod
+    def getValidatorRegex(cls) -> QRegularExpression:
+        """Returns the shared, precompiled QRegularExpression matching text made only of emojis."""
+        return cls._compiledRegex(
+            "validator",
+            f"^(?:{cls._EMOJI_PATTERN})+$",
+            QRegularExpression.PatternOption.UseUnicodePropertiesOption
+        )
+
+    @classmethod
+    def _compiledRegex(cls, key: str, pattern: str,
+                       options: QRegularExpression.PatternOption = QRegularExpression.PatternOption.NoPatternOption
+                       ) -> QRegularExpression:
+        """
+        Returns the regex registered under the given key, compiling it on first use.
+        Patterns are compiled (and JIT optimized) once per process and shared by every caller.
+        """
+        regex = cls._REGEX_CACHE.get(key)
+        if regex is None:
+            regex = QRegularExpression(pattern, options)
+            regex.optimize()
+            cls._REGEX_CACHE[key] = regex
+        return regex
+
     @classmethod
     def findEmojis(cls, text: str) -> typing.Generator[QRegularExpressionMatch, None, None]:
         """
         Finds all emojis in the given text.
         Returns a generator of QRegularExpressionMatch objects.
         """
-        regex = cls.getRegex()
-        iterator = regex.globalMatch(text)
+        iterator = cls.getRegex().globalMatch(text)
         while iterator.hasNext():
             yield iterator.next()
 
@@ -55,24 +134,49 @@ class EmojiFinder:
         """
         Finds all emojis in the given text.
         Returns a generator of Emoji objects.
+
+        With the Trie engine the matches are EmojiMatch objects, which expose the same
+        captured/capturedStart/capturedEnd accessors.
         """
+        if cls._engine == cls.Engine.Trie:
+            yield from EmojiTrie.instance().finditer(text, ignore_colors)
+            return
+
         for match in cls.findEmojis(text):
             emoji_str = match.captured(0)
             if ignore_colors:
-                for color_match in cls.findEmojiColors(emoji_str):
-                    emoji_str = emoji_str.replace(color_match.captured(0), "")
-            emoji = get_emoji_by_code(emoji_str)
+                emoji = cls.splitEmojiColors(emoji_str)[0]
+            else:
+                emoji = EmojiResolver.byCode(emoji_str)
             if emoji:
                 yield emoji, match
 
+    @classmethod
+    def tokenize(cls, texts: typing.Iterable[str], ignore_colors: bool = True,
+                 utf16: bool = False) -> typing.List[array]:
+        """
+        Finds all emojis in many texts at once, without creating a match object per emoji.
+        Returns, for each text, a flat array of (start, end, emoji id) triples. Positions are
+        Python string indices, or UTF-16 code units (Qt positions) when utf16 is True.
+        Sequences that aren't in the database (e.g. unqualified or unknown ZWJ sequences) are
+        split into the known emojis they are made of.
+        Use emojiFromId to get the Emoji of an id.
+        """
+        trie = EmojiTrie.instance()
+        return [trie.spans(text, ignore_colors, utf16, components=True) for text in texts]
+
+    @staticmethod
+    def emojiFromId(emoji_id: int) -> Emoji:
+        """Returns the Emoji of an id reported by tokenize."""
+        return EmojiTrie.instance().emoji(emoji_id)
+
     @classmethod
     def findAliases(cls, text: str) -> typing.Generator[QRegularExpressionMatch, None, None]:
         """
         Finds all aliases in the given text.
         Returns a generator of QRegularExpressionMatch objects.
         """
-        regex = QRegularExpression(cls._ALIAS_PATTERN)
-        iterator = regex.globalMatch(text)
+        iterator = cls.getAliasRegex().globalMatch(text)
         while iterator.hasNext():
             yield iterator.next()
 
@@ -85,26 +189,1185 @@ class EmojiFinder:
         for match in cls.findAliases(text):
             first_captured = match.captured(0)
             alias = first_captured[1:-1]
-            emoji = get_emoji_by_alias(alias)
+            emoji = EmojiResolver.byAlias(alias)
             if emoji:
                 yield emoji, match
 
+    @classmethod
+    def maxAliasLength(cls) -> int:
+        """Returns the length of the longest alias, colons included."""
+        if cls._max_alias_length is None:
+            cls._max_alias_length = max(len(alias) for emoji in EMOJI_DB for alias in emoji.aliases) + 2
+        return cls._max_alias_length
+
+    @classmethod
+    def splitEmojiColors(cls, code: str) -> typing.Tuple[typing.Optional[Emoji], typing.Tuple[str, ...]]:
+        """
+        Resolves an emoji code that may carry skin tone modifiers.
+        Returns the base Emoji (or None) and the stripped modifiers, in order.
+        Results are memoized by EmojiResolver, so a sequence seen before costs a single lookup.
+        """
+        return EmojiResolver.splitColors(code)
+
+    @classmethod
+    def removeEmojiColors(cls, text: str) -> str:
+        """Returns the text without skin tone modifiers."""
+        return text.translate(cls._REMOVE_COLORS_TABLE)
+
     @classmethod
     def findEmojiColors(cls, text: str) -> typing.Generator[QRegularExpressionMatch, None, None]:
-        re_color = QRegularExpression(cls._COLOR_PATTERN)
-        iterator = re_color.globalMatch(text)
+        """
+        Finds all skin tone modifiers in the given text.
+        Returns a generator of QRegularExpressionMatch objects.
+        """
+        iterator = cls.getColorRegex().globalMatch(text)
         while iterator.hasNext():
             yield iterator.next()
 
 
+class EmojiResolver:
+    """
+    Central code/alias -> Emoji resolution used by the whole library.
+
+    The emojis database is indexed into dictionaries once, at first use. Every lookup,
+    including derived ones such as skin-toned codes, is memoized in a bounded LRU cache
+    with hit/miss counters.
+    """
+
+    _by_code: typing.Optional[typing.Dict[str, Emoji]] = None
+    _by_alias: typing.Optional[typing.Dict[str, Emoji]] = None
+
+    # (kind, key) -> result, least recently used first
+    _cache: OrderedDict = OrderedDict()
+    _max_size = 4096
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def byCode(cls, code: str) -> typing.Optional[Emoji]:
+        """Returns the Emoji with exactly the given code, or None."""
+        return cls._cached("code", code, cls._resolve_code)
+
+    @classmethod
+    def byAlias(cls, alias: str) -> typing.Optional[Emoji]:
+        """Returns the Emoji with the given alias (without colons), or None."""
+        return cls._cached("alias", alias, cls._resolve_alias)
+
+    @classmethod
+    def splitColors(cls, code: str) -> typing.Tuple[typing.Optional[Emoji], typing.Tuple[str, ...]]:
+        """Returns the base Emoji of a code that may carry skin tones, and the stripped tones."""
+        return cls._cached("colors", code, cls._resolve_colors)
+
+    @classmethod
+    def maxSize(cls) -> int:
+        return cls._max_size
+
+    @classmethod
+    def setMaxSize(cls, max_size: int):
+        """Sets how many lookups are memoized. Zero disables memoization."""
+        cls._max_size = max(max_size, 0)
+        cls._trim()
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls._cache)
+
+    @classmethod
+    def hits(cls) -> int:
+        return cls._hits
+
+    @classmethod
+    def misses(cls) -> int:
+        return cls._misses
+
+    @classmethod
+    def clear(cls):
+        """Empties the memoized lookups and resets the counters."""
+        cls._cache.clear()
+        cls._hits = 0
+        cls._misses = 0
+
+    # --- Internal Logic ---
+
+    @classmethod
+    def _cached(cls, kind: str, key: str, resolve: typing.Callable[[str], T]) -> T:
+        cache_key = (kind, key)
+        try:
+            result = cls._cache[cache_key]
+        except KeyError:
+            cls._misses += 1
+            result = resolve(key)
+            if cls._max_size:
+                cls._cache[cache_key] = result
+                cls._trim()
+            return result
+        cls._hits += 1
+        cls._cache.move_to_end(cache_key)
+        return result
+
+    @classmethod
+    def _trim(cls):
+        while len(cls._cache) > cls._max_size:
+            cls._cache.popitem(last=False)
+
+    @classmethod
+    def _index(cls):
+        if cls._by_code is None:
+            cls._by_code = {}
+            cls._by_alias = {}
+            for emoji in EMOJI_DB:
+                cls._by_code.setdefault(emoji.emoji, emoji)
+                for alias in emoji.aliases:
+                    cls._by_alias.setdefault(alias, emoji)
+
+    @classmethod
+    def _resolve_code(cls, code: str) -> typing.Optional[Emoji]:
+        cls._index()
+        return cls._by_code.get(code)
+
+    @classmethod
+    def _resolve_alias(cls, alias: str) -> typing.Optional[Emoji]:
+        cls._index()
+        return cls._by_alias.get(alias)
+
+    @classmethod
+    def _resolve_colors(cls, code: str) -> typing.Tuple[typing.Optional[Emoji], typing.Tuple[str, ...]]:
+        base = EmojiFinder.removeEmojiColors(code)
+        if len(base) == len(code):
+            return cls._resolve_code(code), ()
+        colors = tuple(char for char in code if char in EmojiFinder._COLORS)
+        return cls._resolve_code(base), colors
+
+
+class EmojiMatch:
+    """
+    Lightweight match produced by EmojiTrie.
+    Mirrors the QRegularExpressionMatch accessors used across the library. Positions are
+    in UTF-16 code units, like Qt's, so they can be used directly on a QTextDocument.
+    """
+
+    __slots__ = ("_text", "_start", "_end")
+
+    def __init__(self, text: str, start: int, end: int):
+        self._text = text
+        self._start = start
+        self._end = end
+
+    def captured(self, nth: int = 0) -> str:
+        return self._text
+
+    def capturedStart(self, nth: int = 0) -> int:
+        return self._start
+
+    def capturedEnd(self, nth: int = 0) -> int:
+        return self._end
+
+    def capturedLength(self, nth: int = 0) -> int:
+        return self._end - self._start
+
+    def colors(self) -> typing.Tuple[str, ...]:
+        """Returns the skin tone modifiers of the matched emoji, in order."""
+        return EmojiFinder.splitEmojiColors(self._text)[1]
+
+
+class EmojiTrie:
+    """
+    Code point trie built from the emojis database.
+
+    Text is scanned in a single pass: each emoji token is delimited with the same rules as
+    EmojiFinder's regex and resolved to its Emoji while it is walked, without a regex
+    match object or a database search per emoji.
+    """
+
+    _VS16 = "\uFE0F"
+    _ZWJ = "\u200D"
+    _KEYCAP = "\u20E3"
+    _BLACK_FLAG = "\U0001F3F4"
+    _KEYCAP_BASES = frozenset("0123456789#*")
+    _REGIONAL_INDICATORS = frozenset(chr(code) for code in range(0x1F1E6, 0x1F200))
+    _COLORS = frozenset(EmojiFinder._COLORS)
+    _TAG_SEQUENCES = (
+        "\U000E0067\U000E0062\U000E0065\U000E006E\U000E0067\U000E007F",
+        "\U000E0067\U000E0062\U000E0073\U000E0063\U000E0074\U000E007F",
+        "\U000E0067\U000E0062\U000E0077\U000E006C\U000E0073\U000E007F",
+    )
+
+    # Key of the emoji id stored in terminal nodes (never a valid character)
+    _END = ""
+
+    _instance: typing.Optional["EmojiTrie"] = None
+
+    def __init__(self, emojis: typing.Iterable[Emoji]):
+        self._root: dict = {}
+        self._emojis: typing.List[Emoji] = []
+        self._pictographic = self._extended_pictographic()
+        starts = self._pictographic | self._KEYCAP_BASES | self._REGIONAL_INDICATORS
+        self._start_regex = re.compile(self._char_class(starts))
+        for emoji in emojis:
+            self.insert(emoji)
+
+    @classmethod
+    def instance(cls) -> "EmojiTrie":
+        """Returns the trie of the whole emojis database, built on first use."""
+        if cls._instance is None:
+            cls._instance = cls(EMOJI_DB)
+        return cls._instance
+
+    def insert(self, emoji: Emoji) -> int:
+        """Adds the emoji to the trie and returns its id."""
+        node = self._root
+        for char in emoji.emoji:
+            node = node.setdefault(char, {})
+        if self._END not in node:
+            node[self._END] = len(self._emojis)
+            self._emojis.append(emoji)
+        return node[self._END]
+
+    def get(self, code: str) -> typing.Optional[Emoji]:
+        """Returns the Emoji with exactly the given code, or None."""
+        node = self._root
+        for char in code:
+            node = node.get(char)
+            if node is None:
+                return None
+        emoji_id = node.get(self._END)
+        return None if emoji_id is None else self._emojis[emoji_id]
+
+    def emoji(self, emoji_id: int) -> Emoji:
+        """Returns the Emoji with the given id (as reported by spans)."""
+        return self._emojis[emoji_id]
+
+    def scan(self, text: str, ignore_colors: bool = False) -> typing.Generator[
+            typing.Tuple[int, int, Emoji], None, None]:
+        """
+        Finds all emojis in the given text.
+        Returns a generator of (start, end, Emoji) with Python string indices.
+        """
+        emojis = self._emojis
+        for start, end, emoji_id in self._tokens(text, ignore_colors):
+            yield start, end, emojis[emoji_id]
+
+    def spans(self, text: str, ignore_colors: bool = False, utf16: bool = False,
+              components: bool = False) -> array:
+        """
+        Finds all emojis in the given text.
+        Returns a flat array of (start, end, emoji id) triples. Positions are Python string
+        indices, or UTF-16 code units when utf16 is True. With components, sequences that
+        aren't in the trie are split into the longest known emojis they start with.
+        """
+        result = array("l")
+        if not utf16:
+            for token in self._tokens(text, ignore_colors, components):
+                result.extend(token)
+            return result
+
+        offset = 0
+        last = 0
+        for start, end, emoji_id in self._tokens(text, ignore_colors, components):
+            offset += utf16_length(text[last:start])
+            length = utf16_length(text[start:end])
+            result.extend((offset, offset + length, emoji_id))
+            offset += length
+            last = end
+        return result
+
+    def finditer(self, text: str, ignore_colors: bool = False) -> typing.Generator[
+            typing.Tuple[Emoji, EmojiMatch], None, None]:
+        """
+        Finds all emojis in the given text.
+        Returns a generator of (Emoji, EmojiMatch) with UTF-16 positions.
+        """
+        offset = 0
+        last = 0
+        for start, end, emoji in self.scan(text, ignore_colors):
+            offset += utf16_length(text[last:start])
+            token = text[start:end]
+            length = utf16_length(token)
+            yield emoji, EmojiMatch(token, offset, offset + length)
+            offset += length
+            last = end
+
+    def _tokens(self, text: str, ignore_colors: bool,
+                components: bool = False) -> typing.Generator[typing.Tuple[int, int, int], None, None]:
+        """
+        Yields (start, end, emoji id) for every emoji token of the text found in the trie.
+        With components, tokens that aren't found yield their longest known prefix instead,
+        and the scan resumes right after it.
+        """
+        search = self._start_regex.search
+        match = search(text)
+        while match:
+            start = match.start()
+            end = self._token_end(text, start)
+            if end is None:
+                match = search(text, start + 1)
+                continue
+            emoji_id = self._walk(text, start, end, ignore_colors)
+            if emoji_id is None and components:
+                end, emoji_id = self._longest_prefix(text, start, end, ignore_colors)
+                if emoji_id is None:
+                    end = start + 1
+            if emoji_id is not None:
+                yield start, end, emoji_id
+            match = search(text, end)
+
+    def _token_end(self, text: str, start: int) -> typing.Optional[int]:
+        """Returns where the emoji token starting at start ends (same rules as the regex), or None."""
+        char = text[start]
+        length = len(text)
+
+        if char in self._REGIONAL_INDICATORS:
+            if start + 1 < length and text[start + 1] in self._REGIONAL_INDICATORS:
+                return start + 2
+            return None
+
+        if char in self._KEYCAP_BASES:
+            end = start + 1
+            if end < length and text[end] == self._VS16:
+                end += 1
+            if end < length and text[end] == self._KEYCAP:
+                return end + 1
+            return None
+
+        if char == self._BLACK_FLAG:
+            for tags in self._TAG_SEQUENCES:
+                if text.startswith(tags, start + 1):
+                    return start + 1 + len(tags)
+
+        # Extended pictographic sequence: EP FE0F? color? (ZWJ EP FE0F? color?)*
+        end = start + 1
+        while True:
+            if end < length and text[end] == self._VS16:
+                end += 1
+            if end < length and text[end] in self._COLORS:
+                end += 1
+            if end + 1 < length and text[end] == self._ZWJ and text[end + 1] in self._pictographic:
+                end += 2
+            else:
+                return end
+
+    def _walk(self, text: str, start: int, end: int, ignore_colors: bool) -> typing.Optional[int]:
+        node = self._root
+        for index in range(start, end):
+            char = text[index]
+            if ignore_colors and char in self._COLORS:
+                continue
+            node = node.get(char)
+            if node is None:
+                return None
+        return node.get(self._END)
+
+    def _longest_prefix(self, text: str, start: int, end: int,
+                        ignore_colors: bool) -> typing.Tuple[int, typing.Optional[int]]:
+        """Returns the end and id of the longest emoji of the trie starting at start (None if there is none)."""
+        node = self._root
+        found = (start, None)
+        for index in range(start, end):
+            char = text[index]
+            if not (ignore_colors and char in self._COLORS):
+                node = node.get(char)
+                if node is None:
+                    break
+            emoji_id = node.get(self._END)
+            if emoji_id is not None:
+                found = (index + 1, emoji_id)
+        return found
+
+    @staticmethod
+    def _extended_pictographic() -> typing.FrozenSet[str]:
+        """
+        Returns the characters with the Extended_Pictographic property, taken from the
+        same PCRE2 tables used by EmojiFinder's regex so both engines agree on tokens.
+        """
+        candidates = "".join(chr(code) for code in range(0xA9, 0x20000) if not 0xD800 <= code <= 0xDFFF)
+        regex = QRegularExpression(
+            R"\p{Extended_Pictographic}+",
+            QRegularExpression.PatternOption.UseUnicodePropertiesOption
+        )
+        chars = set()
+        iterator = regex.globalMatch(candidates)
+        while iterator.hasNext():
+            chars.update(iterator.next().captured(0))
+        return frozenset(chars)
+
+    @staticmethod
+    def _char_class(chars: typing.Iterable[str]) -> str:
+        """Builds a compact regex character class (with ranges) matching the given characters."""
+        codes = sorted(ord(char) for char in chars)
+        ranges = []
+        first = last = codes[0]
+        for code in codes[1:]:
+            if code != last + 1:
+                ranges.append((first, last))
+                first = code
+            last = code
+        ranges.append((first, last))
+        parts = (re.escape(chr(a)) if a == b else f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges)
+        return "[" + "".join(parts) + "]"
+
+
+def utf16_length(text: str) -> int:
+    """Returns the length of the text in UTF-16 code units (Qt string positions)."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class EmojiSourceCache:
+    """
+    Bounded pool of parsed twemoji source images, shared by every rendering size.
+
+    Each emoji file is opened and parsed once: PNG files are kept decoded (QImage) and only
+    scaled afterwards, SVG files are kept as QSvgRenderer trees and only rasterized. Entries
+    are evicted in least-recently-used order. It is safe to use from several threads.
+    """
+
+    class Format(int, Enum):
+        Png = 1
+        Svg = 2
+
+    def __init__(self, max_entries: int = 256, source_format: Format = Format.Png):
+        self._max_entries = max_entries
+        self._format = source_format
+        # emoji -> QImage (Png) or (QSvgRenderer, Lock) (Svg), least recently used first
+        self._sources: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._opens = 0
+        self._parses = 0
+        self._hits = 0
+
+    def render(self, emoji_data: Emoji, size: QSize, padding: QMargins = QMargins()) -> QImage:
+        """
+        Returns the emoji rasterized at size (physical pixels) inside a transparent padding,
+        in ARGB32 premultiplied format. Returns a null QImage if the emoji image cannot be read.
+        """
+        source = self._source(emoji_data)
+        if source is None:
+            return QImage()
+        if isinstance(source, QImage):
+            # Area-averaged scaling (QPainter's bilinear one aliases small sizes)
+            image = source.scaled(size, Qt.AspectRatioMode.IgnoreAspectRatio,
+                                  Qt.TransformationMode.SmoothTransformation)
+            if padding.isNull():
+                return image
+            # Pixels outside the image are copied as transparent: no fill and no QPainter pass
+            return image.copy(QRect(QPoint(), size).marginsAdded(padding))
+
+        renderer, lock = source
+        image = QImage(size.grownBy(padding), QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+        # A renderer must not be used by several threads at once
+        with lock:
+            painter = QPainter(image)
+            # The padding is only the viewport transform of the vector tree
+            renderer.render(painter, QRectF(padding.left(), padding.top(), size.width(), size.height()))
+            painter.end()
+        return image
+
+    def sourceFormat(self) -> Format:
+        return self._format
+
+    def setSourceFormat(self, source_format: Format):
+        if source_format != self._format:
+            self._format = source_format
+            self.clear()
+
+    def maxEntries(self) -> int:
+        return self._max_entries
+
+    def setMaxEntries(self, max_entries: int):
+        with self._lock:
+            self._max_entries = max_entries
+            self._trim()
+
+    def clear(self):
+        with self._lock:
+            self._sources.clear()
+
+    # --- Statistics ---
+
+    def count(self) -> int:
+        return len(self._sources)
+
+    def opens(self) -> int:
+        """Returns how many files were opened."""
+        return self._opens
+
+    def parses(self) -> int:
+        """Returns how many files were parsed (decoded)."""
+        return self._parses
+
+    def hits(self) -> int:
+        """Returns how many renderings reused a parsed source (file opens and parses avoided)."""
+        return self._hits
+
+    def resetStats(self):
+        with self._lock:
+            self._opens = 0
+            self._parses = 0
+            self._hits = 0
+
+    # --- Internal Logic ---
+
+    def _source(self, emoji_data: Emoji):
+        key = emoji_data[1]
+        with self._lock:
+            source = self._sources.get(key)
+            if source is not None:
+                self._sources.move_to_end(key)
+                self._hits += 1
+                return source
+
+        # Parsed outside the lock, so other emojis keep rendering meanwhile
+        source = self._parse(emoji_data)
+        if source is not None:
+            with self._lock:
+                self._sources[key] = source
+                self._trim()
+        return source
+
+    def _parse(self, emoji_data: Emoji):
+        svg = self._format == self.Format.Svg
+        emoji_path = get_emoji_path(emoji_data[1], "svg" if svg else "png")
+        if emoji_path is None:
+            return None
+        with self._lock:
+            self._opens += 1
+
+        if svg:
+            renderer = QSvgRenderer(str(emoji_path))
+            with self._lock:
+                self._parses += 1
+            return (renderer, threading.Lock()) if renderer.isValid() else None
+
+        reader = QImageReader(str(emoji_path))
+        if not reader.canRead():
+            return None
+        image = reader.read()
+        with self._lock:
+            self._parses += 1
+        if image.isNull():
+            return None
+        return image.convertToFormat(QImage.Format.Format_ARGB32_Premultiplied)
+
+    def _trim(self):
+        while len(self._sources) > self._max_entries:
+            self._sources.popitem(last=False)
+
+
+class EmojiPixmapCache:
+    """
+    Memory-bounded cache of emoji pixmaps, independent from the application-wide QPixmapCache.
+
+    Entries are grouped in pools per rendering size (margin, width, height, dpr), each one
+    in least-recently-used order. When the byte budget is exceeded, entries are evicted
+    from the least recently used pool first, so sizes that are no longer shown (e.g. after
+    a zoom) are released before the ones on screen.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self._max_bytes = max_bytes
+        # pool key -> OrderedDict(key -> pixmap); pools and entries least recently used first
+        self._pools: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._count = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def find(self, key: tuple) -> typing.Optional[QPixmap]:
+        """Returns the pixmap stored under key, or None."""
+        pool_key = key[1:]
+        pool = self._pools.get(pool_key)
+        pixmap = pool.get(key) if pool is not None else None
+        if pixmap is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        pool.move_to_end(key)
+        self._pools.move_to_end(pool_key)
+        return pixmap
+
+    def insert(self, key: tuple, pixmap: QPixmap):
+        """Stores the pixmap under key, a tuple whose first item identifies the emoji."""
+        self.remove(key)
+        pool_key = key[1:]
+        pool = self._pools.get(pool_key)
+        if pool is None:
+            pool = self._pools[pool_key] = OrderedDict()
+        else:
+            self._pools.move_to_end(pool_key)
+        pool[key] = pixmap
+        self._bytes += self._pixmap_bytes(pixmap)
+        self._count += 1
+        self._evict()
+
+    def contains(self, key: tuple) -> bool:
+        """Returns whether key is cached, without counting a hit or a miss nor refreshing it."""
+        pool = self._pools.get(key[1:])
+        return pool is not None and key in pool
+
+    def remove(self, key: tuple) -> bool:
+        pool_key = key[1:]
+        pool = self._pools.get(pool_key)
+        if pool is None or key not in pool:
+            return False
+        self._discard(pool_key, pool, pool.pop(key))
+        return True
+
+    def clear(self):
+        self._pools.clear()
+        self._bytes = 0
+        self._count = 0
+
+    def maxBytes(self) -> int:
+        return self._max_bytes
+
+    def setMaxBytes(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._evict()
+
+    # --- Statistics ---
+
+    def count(self) -> int:
+        return self._count
+
+    def bytes(self) -> int:
+        return self._bytes
+
+    def hits(self) -> int:
+        return self._hits
+
+    def misses(self) -> int:
+        return self._misses
+
+    def evictions(self) -> int:
+        return self._evictions
+
+    def poolStats(self) -> typing.Dict[tuple, typing.Tuple[int, int]]:
+        """Returns (entries, bytes) for each pool, keyed by (margin, width, height, dpr)."""
+        return {pool_key: (len(pool), sum(self._pixmap_bytes(pixmap) for pixmap in pool.values()))
+                for pool_key, pool in self._pools.items()}
+
+    def resetStats(self):
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # --- Internal Logic ---
+
+    def _evict(self):
+        while self._bytes > self._max_bytes and self._pools:
+            pool_key, pool = next(iter(self._pools.items()))
+            _, pixmap = pool.popitem(last=False)
+            self._discard(pool_key, pool, pixmap)
+            self._evictions += 1
+
+    def _discard(self, pool_key: tuple, pool: OrderedDict, pixmap: QPixmap):
+        self._bytes -= self._pixmap_bytes(pixmap)
+        self._count -= 1
+        if not pool:
+            del self._pools[pool_key]
+
+    @staticmethod
+    def _pixmap_bytes(pixmap: QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class EmojiDiskCache:
+    """
+    Persistent cache of rasterized emoji images, shared across application launches.
+
+    Images are stored as raw ARGB32 (premultiplied) buffers in
+    <directory>/twemoji-cache-<twemoji-api version>/<width>x<height>-m<margin>-dpr<dpr>/<code points>.argb
+    and memory-mapped on demand. Each file starts with a header holding its dimensions and
+    a CRC32 of the pixels; files failing the check, and the cache directories of other
+    twemoji-api versions, are deleted. Nothing else in the directory is touched.
+    It is safe to use from several threads.
+    """
+
+    _MAGIC = b"QEWE"
+    _FORMAT_VERSION = 1
+    # magic, format version, width, height, bytes per line, crc32
+    _HEADER = struct.Struct("<4sIIIII")
+    _IMAGE_FORMAT = QImage.Format.Format_ARGB32_Premultiplied
+    # Prefix of the version directories, the only ones the cache deletes
+    _VERSION_PREFIX = "twemoji-cache-"
+
+    def __init__(self, directory: typing.Union[str, os.PathLike], variant: str = ""):
+        self._root = os.fspath(directory)
+        # Distinguishes images rendered differently (e.g. from SVG sources)
+        self._variant = variant
+        self._directory = os.path.join(self._root, self._VERSION_PREFIX + self.twemojiVersion())
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._invalidated = 0
+        os.makedirs(self._directory, exist_ok=True)
+        self._remove_stale_versions()
+
+    @staticmethod
+    def twemojiVersion() -> str:
+        try:
+            return metadata.version("twemoji-api")
+        except metadata.PackageNotFoundError:
+            return "unknown"
+
+    def directory(self) -> str:
+        """Returns the directory of the current twemoji-api version."""
+        return self._directory
+
+    def root(self) -> str:
+        """Returns the directory given to the constructor."""
+        return self._root
+
+    def variant(self) -> str:
+        return self._variant
+
+    def load(self, emoji_data: Emoji, margin: int, size: QSize, dpr: float) -> typing.Optional[QImage]:
+        """Returns the stored image, or None if it is missing or invalid."""
+        path = self._path(emoji_data, margin, size, dpr)
+        try:
+            with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                image = self._read(mapped)
+        except (OSError, ValueError):
+            image = None
+            if os.path.exists(path):
+                self._invalidate(path)
+
+        if image is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        image.setDevicePixelRatio(dpr)
+        return image
+
+    def store(self, emoji_data: Emoji, margin: int, size: QSize, dpr: float, image: QImage):
+        """Writes the image (atomically, so readers never see partial files)."""
+        image = image.convertToFormat(self._IMAGE_FORMAT)
+        pixels = bytes(image.constBits())
+        header = self._HEADER.pack(self._MAGIC, self._FORMAT_VERSION, image.width(), image.height(),
+                                   image.bytesPerLine(), zlib.crc32(pixels))
+        path = self._path(emoji_data, margin, size, dpr)
+        temporary = f"{path}.{os.getpid()}.{id(image)}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary, "wb") as file:
+                file.write(header)
+                file.write(pixels)
+            os.replace(temporary, path)
+            self._writes += 1
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def clear(self):
+        """Deletes every stored image."""
+        shutil.rmtree(self._directory, ignore_errors=True)
+        os.makedirs(self._directory, exist_ok=True)
+
+    # --- Statistics ---
+
+    def hits(self) -> int:
+        return self._hits
+
+    def misses(self) -> int:
+        return self._misses
+
+    def writes(self) -> int:
+        return self._writes
+
+    def invalidated(self) -> int:
+        return self._invalidated
+
+    # --- Internal Logic ---
+
+    def _path(self, emoji_data: Emoji, margin: int, size: QSize, dpr: float) -> str:
+        folder = f"{size.width()}x{size.height()}-m{margin}-dpr{dpr:g}"
+        if self._variant:
+            folder = f"{folder}-{self._variant}"
+        name = "-".join(f"{ord(char):x}" for char in emoji_data[1])
+        return os.path.join(self._directory, folder, f"{name}.argb")
+
+    def _read(self, mapped: mmap.mmap) -> typing.Optional[QImage]:
+        header_size = self._HEADER.size
+        if len(mapped) < header_size:
+            raise ValueError("Truncated header")
+        magic, version, width, height, bytes_per_line, checksum = self._HEADER.unpack_from(mapped)
+        if magic != self._MAGIC or version != self._FORMAT_VERSION:
+            raise ValueError("Unknown format")
+        with memoryview(mapped)[header_size:] as pixels:
+            if len(pixels) != bytes_per_line * height or zlib.crc32(pixels) != checksum:
+                raise ValueError("Corrupted pixels")
+            # Copy, so the image doesn't outlive the mapping
+            return QImage(pixels, width, height, bytes_per_line, self._IMAGE_FORMAT).copy()
+
+    def _invalidate(self, path: str):
+        try:
+            os.remove(path)
+            self._invalidated += 1
+        except OSError:
+            pass
+
+    def _remove_stale_versions(self):
+        current = os.path.basename(self._directory)
+        for entry in os.listdir(self._root):
+            if (entry != current and entry.startswith(self._VERSION_PREFIX)
+                    and os.path.isdir(os.path.join(self._root, entry))):
+                shutil.rmtree(os.path.join(self._root, entry), ignore_errors=True)
+
+
+class EmojiAtlas:
+    """
+    Sprite atlas holding every emoji of one rendering size (margin, width, height, dpr) in a
+    few large pages instead of one QPixmap per emoji.
+
+    Emojis are packed in a fixed grid of cells, rendered into their cell on first use.
+    find returns the page and the source rectangle (in page pixels) to draw with
+    QPainter.drawPixmap(target, page, source). Atlases can be pre-built offline with
+    build and save, and restored with load. Pages are QPixmaps: use it in the GUI thread.
+    """
+
+    _INDEX_FILE = "atlas.json"
+
+    def __init__(self, margin: int, size: QSize, dpr: float = 1.0, page_size: int = 1024):
+        self._margin = margin
+        self._size = QSize(size)
+        self._dpr = dpr
+        # Same physical size as the images of EmojiImageProvider.renderImage
+        self._cell_width = max(int((size.width() + margin * 2) * dpr), 1)
+        self._cell_height = max(int((size.height() + margin * 2) * dpr), 1)
+        self._columns = max(page_size // self._cell_width, 1)
+        self._rows = max(page_size // self._cell_height, 1)
+        self._pages: typing.List[QPixmap] = []
+        # alias -> (page number, source rectangle); None for emojis that cannot be rendered
+        self._sprites: typing.Dict[str, typing.Optional[typing.Tuple[int, QRectF]]] = {}
+        self._slots: typing.Dict[str, int] = {}
+        self._count = 0
+
+    def key(self) -> tuple:
+        """Returns (margin, width, height, dpr), the pool key of EmojiPixmapCache."""
+        return self._margin, self._size.width(), self._size.height(), self._dpr
+
+    def find(self, emoji_data: Emoji) -> typing.Optional[typing.Tuple[QPixmap, QRectF]]:
+        """
+        Returns the page holding the emoji and its source rectangle, rendering it first if
+        needed. Returns None if the emoji image cannot be read.
+        """
+        alias = emoji_data[0][0]
+        sprite = self._sprites.get(alias, self)
+        if sprite is self:
+            sprite = self._sprites[alias] = self._sprite(self._render(emoji_data))
+        if sprite is None:
+            return None
+        return self._pages[sprite[0]], sprite[1]
+
+    def build(self, emojis: typing.Iterable[Emoji]):
+        """Renders the given emojis (e.g. the whole database) ahead of time."""
+        for emoji_data in emojis:
+            alias = emoji_data[0][0]
+            if alias not in self._sprites:
+                self._sprites[alias] = self._sprite(self._render(emoji_data))
+
+    def contains(self, emoji_data: Emoji) -> bool:
+        return self._sprites.get(emoji_data[0][0]) is not None
+
+    # --- Offline Pre-build ---
+
+    def save(self, directory: typing.Union[str, os.PathLike]):
+        """Writes the pages as PNG files and the rect index as JSON in directory."""
+        directory = os.fspath(directory)
+        os.makedirs(directory, exist_ok=True)
+        for number, page in enumerate(self._pages):
+            if not page.save(os.path.join(directory, f"page-{number}.png"), "PNG"):
+                raise OSError(f"Cannot write atlas page {number} in {directory}")
+        index = {
+            "twemoji": EmojiDiskCache.twemojiVersion(),
+            "margin": self._margin,
+            "size": [self._size.width(), self._size.height()],
+            "dpr": self._dpr,
+            "columns": self._columns,
+            "rows": self._rows,
+            "pages": len(self._pages),
+            "slots": self._slots,
+        }
+        with open(os.path.join(directory, self._INDEX_FILE), "w", encoding="utf-8") as file:
+            json.dump(index, file)
+
+    @classmethod
+    def load(cls, directory: typing.Union[str, os.PathLike]) -> "EmojiAtlas":
+        """
+        Restores an atlas written by save.
+        Raises ValueError if it is invalid or was built with another twemoji-api version.
+        """
+        directory = os.fspath(directory)
+        with open(os.path.join(directory, cls._INDEX_FILE), encoding="utf-8") as file:
+            index = json.load(file)
+        if index.get("twemoji") != EmojiDiskCache.twemojiVersion():
+            raise ValueError(f"Atlas in {directory} was built for another twemoji-api version")
+
+        atlas = cls(index["margin"], QSize(*index["size"]), index["dpr"])
+        atlas._columns = index["columns"]
+        atlas._rows = index["rows"]
+        for number in range(index["pages"]):
+            page = QPixmap(os.path.join(directory, f"page-{number}.png"))
+            if page.isNull():
+                raise ValueError(f"Cannot read atlas page {number} in {directory}")
+            atlas._pages.append(page)
+        atlas._count = max(index["slots"].values(), default=-1) + 1
+        for alias, slot in index["slots"].items():
+            sprite = atlas._sprite(slot)
+            page = atlas._pages[sprite[0]] if sprite[0] < len(atlas._pages) else QPixmap()
+            if not page.rect().contains(sprite[1].toRect()):
+                raise ValueError(f"Atlas index in {directory} does not match its pages")
+            atlas._slots[alias] = slot
+            atlas._sprites[alias] = sprite
+        return atlas
+
+    # --- Statistics ---
+
+    def count(self) -> int:
+        """Returns how many emojis are packed."""
+        return self._count
+
+    def pageCount(self) -> int:
+        return len(self._pages)
+
+    def cellsPerPage(self) -> int:
+        return self._columns * self._rows
+
+    def bytes(self) -> int:
+        return sum(page.width() * page.height() * page.depth() // 8 for page in self._pages)
+
+    # --- Internal Logic ---
+
+    def _render(self, emoji_data: Emoji) -> typing.Optional[int]:
+        image = EmojiImageProvider.renderImage(emoji_data, self._margin, self._size, self._dpr)
+        if image.isNull():
+            return None
+
+        slot = self._count
+        self._count += 1
+        self._slots[emoji_data[0][0]] = slot
+        page = self._page_for(slot)
+
+        # Drawn in page pixels, ignoring the device pixel ratio of the image
+        image.setDevicePixelRatio(1.0)
+        painter = QPainter(page)
+        painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+        painter.drawImage(self._cell_rect(slot).topLeft(), image)
+        painter.end()
+        return slot
+
+    def _page_for(self, slot: int) -> QPixmap:
+        """Returns the page of the slot, creating or growing it (doubling its rows) as needed."""
+        number, cell = divmod(slot, self.cellsPerPage())
+        rows = cell // self._columns + 1
+        if number == len(self._pages):
+            self._pages.append(self._new_page(min(max(rows, 8), self._rows), None))
+        elif self._pages[number].height() < rows * self._cell_height:
+            current = self._pages[number].height() // self._cell_height
+            self._pages[number] = self._new_page(min(max(rows, current * 2), self._rows), self._pages[number])
+        return self._pages[number]
+
+    def _new_page(self, rows: int, previous: typing.Optional[QPixmap]) -> QPixmap:
+        page = QPixmap(self._columns * self._cell_width, rows * self._cell_height)
+        page.fill(Qt.GlobalColor.transparent)
+        if previous is not None:
+            painter = QPainter(page)
+            painter.drawPixmap(0, 0, previous)
+            painter.end()
+        return page
+
+    def _sprite(self, slot: typing.Optional[int]) -> typing.Optional[typing.Tuple[int, QRectF]]:
+        if slot is None:
+            return None
+        return slot // self.cellsPerPage(), QRectF(self._cell_rect(slot))
+
+    def _cell_rect(self, slot: int) -> QRect:
+        cell = slot % self.cellsPerPage()
+        return QRect((cell % self._columns) * self._cell_width, (cell // self._columns) * self._cell_height,
+                     self._cell_width, self._cell_height)
+
+
+class EmojiImageNotifier(QObject):
+    """
+    Signals of EmojiImageProvider (which is a static class, not a QObject).
+    pixmapReady is emitted in the GUI thread with the cache key of a pixmap requested
+    through EmojiImageProvider.requestPixmap once it is in the cache.
+    """
+
+    pixmapReady = Signal(object)
+    # Emitted by worker threads, delivered (queued) in the GUI thread
+    _imageRendered = Signal(object, QImage)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._imageRendered.connect(self._on_image_rendered, Qt.ConnectionType.QueuedConnection)
+
+    def _on_image_rendered(self, key: tuple, image: QImage):
+        if EmojiImageProvider._store_rendered(key, image):
+            self.pixmapReady.emit(key)
+
+
+class _EmojiRenderTask(QRunnable):
+    """Renders one emoji image in a QThreadPool worker."""
+
+    def __init__(self, key: tuple, emoji_data: Emoji, margin: int, size: QSize, dpr: float,
+                 notifier: EmojiImageNotifier):
+        super().__init__()
+        # Deleted by the pool once run: EmojiImageProvider only takes it back while not started
+        self._started = False
+        self._key = key
+        self._emoji_data = emoji_data
+        self._margin = margin
+        self._size = QSize(size)
+        self._dpr = dpr
+        self._notifier = notifier
+
+    def run(self):
+        with EmojiImageProvider._task_lock:
+            self._started = True
+        image = EmojiImageProvider.renderImage(self._emoji_data, self._margin, self._size, self._dpr)
+        self._notifier._imageRendered.emit(self._key, image)
+
+
 class EmojiImageProvider:
     """
     Class exclusively responsible for loading, resizing, and caching
     emoji images.
     """
 
+    # Keyed by (alias, margin, width, height, dpr)
+    _cache = EmojiPixmapCache()
+
+    # Optional persistent cache, see setDiskCacheDirectory
+    _disk_cache: typing.Optional[EmojiDiskCache] = None
+
+    # Parsed source files, shared by every size
+    _source_cache = EmojiSourceCache()
+
+    # Asynchronous rendering (created on first use)
+    _notifier: typing.Optional[EmojiImageNotifier] = None
+    _thread_pool: typing.Optional[QThreadPool] = None
+    _pending: typing.Dict[tuple, _EmojiRenderTask] = {}
+    # Guards the start of the tasks, which the pools delete once run
+    _task_lock = threading.Lock()
+
+    # Background pre-warming, see prewarm (keys queued in the prewarm pool)
+    _prewarm_pool: typing.Optional[QThreadPool] = None
+    _prewarming: typing.Set[tuple] = set()
+
+    # Sprite atlases, keyed by (margin, width, height, dpr), least recently used first
+    _atlases: typing.OrderedDict[tuple, EmojiAtlas] = OrderedDict()
+    _max_atlas_bytes = 64 * 1024 * 1024
+
+    @classmethod
+    def cache(cls) -> EmojiPixmapCache:
+        """Returns the pixmap cache, e.g. to set its byte budget or read its statistics."""
+        return cls._cache
+
+    @classmethod
+    def diskCache(cls) -> typing.Optional[EmojiDiskCache]:
+        return cls._disk_cache
+
+    @classmethod
+    def setDiskCacheDirectory(cls, directory: typing.Optional[typing.Union[str, os.PathLike]]):
+        """
+        Enables a persistent cache of rendered emojis in the given directory, reused across
+        application launches. None disables it.
+        """
+        cls._disk_cache = EmojiDiskCache(directory, cls._disk_cache_variant()) if directory is not None else None
+
+    @classmethod
+    def sourceCache(cls) -> EmojiSourceCache:
+        """Returns the cache of parsed source files, e.g. to read how many parses it avoided."""
+        return cls._source_cache
+
+    @classmethod
+    def sourceFormat(cls) -> EmojiSourceCache.Format:
+        return cls._source_cache.sourceFormat()
+
+    @classmethod
+    def setSourceFormat(cls, source_format: EmojiSourceCache.Format):
+        """
+        Selects the twemoji files emojis are rendered from: PNG (72x72, the default) or SVG
+        (sharp at any size). Emojis already rendered are discarded.
+        """
+        if source_format == cls.sourceFormat():
+            return
+        cls._source_cache.setSourceFormat(source_format)
+        cls._cache.clear()
+        cls.clearAtlases()
+        if cls._disk_cache is not None:
+            cls._disk_cache = EmojiDiskCache(cls._disk_cache.root(), cls._disk_cache_variant())
+
+    @classmethod
+    def _disk_cache_variant(cls) -> str:
+        return "svg" if cls.sourceFormat() == EmojiSourceCache.Format.Svg else ""
+
+    @classmethod
+    def atlas(cls, margin: int, size: QSize, dpr: float = 1.0) -> EmojiAtlas:
+        """Returns the sprite atlas of a rendering size, creating it on first use."""
+        key = (margin, size.width(), size.height(), dpr)
+        atlas = cls._atlases.get(key)
+        if atlas is None:
+            atlas = cls._atlases[key] = EmojiAtlas(margin, size, dpr)
+            cls._trim_atlases()
+        elif next(reversed(cls._atlases)) != key:
+            # Another size is drawn (e.g. after a zoom): the previous ones may go over the budget
+            cls._atlases.move_to_end(key)
+            cls._trim_atlases()
+        return atlas
+
+    @classmethod
+    def addAtlas(cls, atlas: EmojiAtlas):
+        """Registers a pre-built atlas (see EmojiAtlas.load), replacing the one of its size."""
+        cls._atlases[atlas.key()] = atlas
+        cls._atlases.move_to_end(atlas.key())
+        cls._trim_atlases()
+
+    @classmethod
+    def clearAtlases(cls):
+        cls._atlases.clear()
+
+    @classmethod
+    def maxAtlasBytes(cls) -> int:
+        return cls._max_atlas_bytes
+
+    @classmethod
+    def setMaxAtlasBytes(cls, max_bytes: int):
+        """
+        Sets the byte budget of the atlases. When another size is drawn, the least recently used
+        atlases are dropped until the budget is met; the one in use is kept, whatever its size.
+        """
+        cls._max_atlas_bytes = max_bytes
+        cls._trim_atlases()
+
+    @classmethod
+    def atlasBytes(cls) -> int:
+        return sum(atlas.bytes() for atlas in cls._atlases.values())
+
+    @classmethod
+    def _trim_atlases(cls):
+        total = cls.atlasBytes()
+        while total > cls._max_atlas_bytes and len(cls._atlases) > 1:
+            total -= cls._atlases.popitem(last=False)[1].bytes()
+
+    @classmethod
+    def getAtlasPixmap(cls, emoji_data: Emoji, margin: int, size: QSize,
+                       dpr: float = 1.0) -> typing.Optional[typing.Tuple[QPixmap, QRectF]]:
+        """
+        Atlas version of getPixmap: returns the atlas page and the source rectangle of the
+        emoji, to be drawn with QPainter.drawPixmap(target, page, source).
+        """
+        return cls.atlas(margin, size, dpr).find(emoji_data)
+
     @staticmethod
-    def getPixmap(emoji_data: Emoji, margin: int, size: QSize, dpr: float = 1.0) -> QPixmap:
+    def cacheKey(emoji_data: Emoji, margin: int, size: QSize, dpr: float = 1.0) -> tuple:
+        """Returns the key identifying a rendered emoji in the cache and in pixmapReady."""
+        return emoji_data[0][0], margin, size.width(), size.height(), dpr
+
+    @classmethod
+    def getPixmap(cls, emoji_data: Emoji, margin: int, size: QSize, dpr: float = 1.0) -> QPixmap:
         """
         Returns a QPixmap ready to be drawn.
 
@@ -114,57 +1377,200 @@ class EmojiImageProvider:
         :param margin:
         """
 
-        # 1. Calculate real physical size (pixels)
-        target_width = int(size.width() * dpr)
-        target_height = int(size.height() * dpr)
-
-        # 2. Generate unique key for Cache
-        emoji_alias = emoji_data[0][0]
-        cache_url = EmojiImageProvider.getUrl(emoji_alias, margin, size, dpr)
+        # 1. Generate unique key for Cache (plain tuple: cheap to build and hash)
+        cache_key = (emoji_data[0][0], margin, size.width(), size.height(), dpr)
 
-        # 3. Try to fetch from Cache
-        pixmap = QPixmap()
-        if QPixmapCache.find(cache_url.toString(), pixmap):
+        # 2. Try to fetch from Cache
+        pixmap = cls._cache.find(cache_key)
+        if pixmap is not None:
             return pixmap
 
         # --- CACHE MISS (Load from disk) ---
+        image = cls.renderImage(emoji_data, margin, size, dpr)
+        if not image.isNull():
+            # The image is not used afterwards: convert it without copying its pixels
+            pixmap = QPixmap.fromImageInPlace(image)
+            pixmap.setDevicePixelRatio(dpr)
+            # Save to cache for future
+            cls._cache.insert(cache_key, pixmap)
+            return pixmap
 
-        # 4. Load using QImageReader (more efficient than QPixmap(path))
-        emoji_path = str(get_emoji_path(emoji_data[1]))
-        reader = QImageReader(emoji_path)
-
-        if reader.canRead():
-            # Important for SVG: Define render size before reading
-            reader.setScaledSize(QSize(target_width, target_height))
-
-            image = reader.read()
-            if not image.isNull():
-                pixmap = QPixmap.fromImage(image)
-                pixmap.setDevicePixelRatio(dpr)
-
-                # Apply margin
-                if margin > 0:
-                    height = int((size.height() + (margin * 2)) * dpr)
-                    width = int((size.width() + (margin * 2)) * dpr)
-                    final_pixmap = QPixmap(width, height)
-                    final_pixmap.setDevicePixelRatio(dpr)
-                    final_pixmap.fill(Qt.GlobalColor.transparent)
-
-                    painter = QPainter(final_pixmap)
-                    painter.drawPixmap(margin, margin, pixmap)
-                    painter.end()
-                    pixmap = final_pixmap
-
-                # Save to cache for future
-                QPixmapCache.insert(cache_url.toString(), pixmap)
-                return pixmap
-
-        # 5. Fallback (Returns a transparent pixmap or placeholder in case of error)
+        # Fallback (Returns a transparent pixmap or placeholder in case of error)
         fallback = QPixmap(size * dpr)
         fallback.fill(Qt.GlobalColor.transparent)
         fallback.setDevicePixelRatio(dpr)
         return fallback
 
+    @classmethod
+    def requestPixmap(cls, emoji_data: Emoji, margin: int, size: QSize, dpr: float = 1.0,
+                      priority: int = 0) -> typing.Optional[QPixmap]:
+        """
+        Asynchronous version of getPixmap.
+        Returns the pixmap if it is cached. Otherwise schedules its rendering on a worker
+        thread and returns None; notifier().pixmapReady is emitted with its cacheKey when
+        it is available.
+        """
+        cache_key = (emoji_data[0][0], margin, size.width(), size.height(), dpr)
+        pixmap = cls._cache.find(cache_key)
+        if pixmap is not None:
+            return pixmap
+
+        task = cls._pending.get(cache_key)
+        if task is None:
+            task = _EmojiRenderTask(cache_key, emoji_data, margin, size, dpr, cls.notifier())
+            cls._pending[cache_key] = task
+            cls.threadPool().start(task, priority)
+        elif cache_key in cls._prewarming and cls._take_task(cls.prewarmThreadPool(), task):
+            # Needed now: move it from the idle queue to the regular one
+            cls._prewarming.discard(cache_key)
+            cls.threadPool().start(task, priority)
+        return None
+
+    @classmethod
+    def prewarm(cls, emojis: typing.Iterable[Emoji], size: QSize, dpr: float = 1.0, margin: int = 0) -> int:
+        """
+        Renders the emojis that are not cached yet in the background, in idle-priority
+        threads, so they are cache hits when painted (e.g. the next category of a picker).
+        Returns how many were queued; cancelPrewarm drops the ones not started yet.
+        """
+        queued = 0
+        for emoji_data in emojis:
+            cache_key = (emoji_data[0][0], margin, size.width(), size.height(), dpr)
+            if cache_key in cls._pending or cls._cache.contains(cache_key):
+                continue
+            task = _EmojiRenderTask(cache_key, emoji_data, margin, size, dpr, cls.notifier())
+            cls._pending[cache_key] = task
+            cls._prewarming.add(cache_key)
+            cls.prewarmThreadPool().start(task)
+            queued += 1
+        return queued
+
+    @classmethod
+    def cancelPrewarm(cls) -> int:
+        """Cancels the pre-warming renderings that have not started yet. Returns how many."""
+        return cls.cancelPending(list(cls._prewarming))
+
+    @classmethod
+    def cancelPending(cls, keys: typing.Optional[typing.Iterable[tuple]] = None) -> int:
+        """
+        Cancels asynchronous requests that have not started yet (all of them by default).
+        Returns how many were cancelled.
+        """
+        if not cls._pending:
+            return 0
+        cancelled = 0
+        for key in list(cls._pending if keys is None else keys):
+            task = cls._pending.get(key)
+            if task is None:
+                continue
+            pool = cls.prewarmThreadPool() if key in cls._prewarming else cls.threadPool()
+            if cls._take_task(pool, task):
+                del cls._pending[key]
+                cls._prewarming.discard(key)
+                # Taken back from the pool, which would have deleted it once run
+                Shiboken.delete(task)
+                cancelled += 1
+        return cancelled
+
+    @classmethod
+    def _take_task(cls, pool: QThreadPool, task: _EmojiRenderTask) -> bool:
+        """Takes a task that has not started yet back from the pool (a started one may already be deleted)."""
+        with cls._task_lock:
+            return not task._started and pool.tryTake(task)
+
+    @classmethod
+    def pendingCount(cls) -> int:
+        return len(cls._pending)
+
+    @classmethod
+    def isPending(cls, key: tuple) -> bool:
+        """Whether an asynchronous request of the cache key is queued or running."""
+        return key in cls._pending
+
+    @classmethod
+    def notifier(cls) -> EmojiImageNotifier:
+        if cls._notifier is None:
+            cls._notifier = EmojiImageNotifier()
+        return cls._notifier
+
+    @classmethod
+    def threadPool(cls) -> QThreadPool:
+        """Returns the thread pool used for asynchronous rendering."""
+        if cls._thread_pool is None:
+            cls._thread_pool = QThreadPool()
+            atexit.register(cls._shutdown)
+        return cls._thread_pool
+
+    @classmethod
+    def prewarmThreadPool(cls) -> QThreadPool:
+        """Returns the idle-priority thread pool used by prewarm."""
+        if cls._prewarm_pool is None:
+            cls._prewarm_pool = QThreadPool()
+            cls._prewarm_pool.setThreadPriority(QThread.Priority.IdlePriority)
+            atexit.register(cls._shutdown)
+        return cls._prewarm_pool
+
+    @classmethod
+    def _shutdown(cls):
+        """Drops queued renderings and waits for running ones before Qt is torn down."""
+        pools = [pool for pool in (cls._thread_pool, cls._prewarm_pool) if pool is not None]
+        for pool in pools:
+            pool.clear()
+        for pool in pools:
+            pool.waitForDone()
+        cls._pending.clear()
+        cls._prewarming.clear()
+
+    @classmethod
+    def renderImage(cls, emoji_data: Emoji, margin: int, size: QSize, dpr: float = 1.0) -> QImage:
+        """
+        Loads and rasterizes the emoji (or reads it from the disk cache, when enabled).
+        Only uses QImage, so it can run in any thread.
+        Returns a null QImage if the emoji image cannot be read.
+        """
+        disk_cache = cls._disk_cache
+        if disk_cache is not None:
+            image = disk_cache.load(emoji_data, margin, size, dpr)
+            if image is None:
+                image = cls._rasterize(emoji_data, margin, size, dpr)
+                if not image.isNull():
+                    disk_cache.store(emoji_data, margin, size, dpr, image)
+            return image
+        return cls._rasterize(emoji_data, margin, size, dpr)
+
+    @classmethod
+    def _rasterize(cls, emoji_data: Emoji, margin: int, size: QSize, dpr: float) -> QImage:
+
+        # 1. Calculate real physical size (pixels)
+        target_width = int(size.width() * dpr)
+        target_height = int(size.height() * dpr)
+
+        # 2. Margin as physical padding around the emoji
+        padding = QMargins()
+        if margin > 0:
+            left = top = int(margin * dpr + 0.5)
+            padding = QMargins(left, top,
+                               int((size.width() + margin * 2) * dpr) - target_width - left,
+                               int((size.height() + margin * 2) * dpr) - target_height - top)
+
+        # 3. Rasterize straight into the padded image, from the parsed source (files are only read once)
+        image = cls._source_cache.render(emoji_data, QSize(target_width, target_height), padding)
+        if not image.isNull():
+            image.setDevicePixelRatio(dpr)
+        return image
+
+    @classmethod
+    def _store_rendered(cls, key: tuple, image: QImage) -> bool:
+        """Caches an image rendered asynchronously. Returns False if it couldn't be rendered."""
+        cls._pending.pop(key, None)
+        cls._prewarming.discard(key)
+        if image.isNull():
+            return False
+        pixmap = QPixmap.fromImageInPlace(image)
+        pixmap.setDevicePixelRatio(key[4])
+        cls._cache.insert(key, pixmap)
+        return True
+
     @staticmethod
     def getUrl(alias: str, margin: int, size: QSize, dpr: float) -> QUrl:
         url = QUrl()
@@ -179,4 +1585,17 @@ class EmojiImageProvider:
 
         url.setQuery(query_params)
 
-        return url
\ No newline at end of file
+        return url
+
+    @staticmethod
+    def parseUrl(url: QUrl) -> typing.Optional[typing.Tuple[str, int, QSize, float]]:
+        """Returns the alias, margin, size and device pixel ratio of a getUrl URL, or None."""
+        if url.scheme() != "twemoji":
+            return None
+        query = QUrlQuery(url)
+        try:
+            return (url.path(), int(query.queryItemValue("margin")),
+                    QSize(int(query.queryItemValue("width")), int(query.queryItemValue("height"))),
+                    float(query.queryItemValue("dpr")))
+        except ValueError:
+            return None
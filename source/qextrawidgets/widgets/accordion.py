@@ -104,6 +104,10 @@ class QAccordion(QWidget):
         self._scroll_layout.removeWidget(item)
         self._items.remove(item)
 
+    def items(self) -> list:
+        """Returns the accordion items in display order."""
+        return sorted(self._items, key=self._scroll_layout.indexOf)
+
     # --- Style Settings (Applied to ALL items) ---
 
     def setIconPosition(self, position: QAccordionHeader.IconPosition):
@@ -207,4 +211,8 @@ class QAccordion(QWidget):
 
     def resetScroll(self):
         """Scrolls to the top of the accordion."""
-        self._scroll.verticalScrollBar().setValue(0)
\ No newline at end of file
+        self._scroll.verticalScrollBar().setValue(0)
+
+    def scrollArea(self) -> QScrollArea:
+        """Returns the scroll area holding the items."""
+        return self._scroll
\ No newline at end of file
@@ -1,6 +1,9 @@
-from PySide6.QtCore import Qt, QSize
+import typing
+
+from PySide6.QtCore import Qt, QSize, QPersistentModelIndex, QRectF, QRect, QPoint
 from PySide6.QtGui import QPainter
 from PySide6.QtWidgets import QStyledItemDelegate, QStyleOptionViewItem, QStyle
+from emojis.db import Emoji
 
 from qextrawidgets.emoji_utils import EmojiImageProvider
 
@@ -9,8 +12,21 @@ class QLazyLoadingEmojiDelegate(QStyledItemDelegate):
     """
     Renders the Emoji. If it's an image, draws the Pixmap.
     If it's font, draws the text. This saves memory compared to creating QIcons.
+
+    In asynchronous mode, emojis that are not cached yet are rendered on a worker thread:
+    a placeholder is painted meanwhile and only their cells are repainted when ready.
+
+    In atlas mode, emojis are drawn from the sprite atlas of their size (see EmojiAtlas)
+    instead of individual pixmaps.
     """
 
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._asynchronous = False
+        self._atlas_mode = False
+        # cache key -> cells (view, index) waiting for that pixmap
+        self._pending: typing.Dict[tuple, typing.List[typing.Tuple[typing.Any, QPersistentModelIndex]]] = {}
+
     def paint(self, painter: QPainter, option: QStyleOptionViewItem, index):
         if not index.isValid():
             return
@@ -32,15 +48,34 @@ class QLazyLoadingEmojiDelegate(QStyledItemDelegate):
         emoji_data = index.data(Qt.ItemDataRole.UserRole)
 
         # 3. Define the rectangle where the icon will be drawn (with padding)
-        icon_rect = getattr(option, "rect")
-        icon_rect_adjusted = icon_rect.adjusted(4, 4, -4, -4)
+        icon_rect_adjusted = self._icon_rect(getattr(option, "rect"))
+        dpr = painter.device().devicePixelRatio()
+
+        if self._atlas_mode:
+            sprite = EmojiImageProvider.getAtlasPixmap(emoji_data, 0, icon_rect_adjusted.size(), dpr)
+            if sprite is not None:
+                page, source = sprite
+                target = QRectF(icon_rect_adjusted.topLeft(), source.size() / dpr)
+                target.moveCenter(QRectF(icon_rect_adjusted).center())
+                painter.drawPixmap(target, page, source)
+            painter.restore()
+            return
 
-        pixmap = EmojiImageProvider.getPixmap(
-            emoji_data,
-            0,
-            icon_rect_adjusted.size(),
-            painter.device().devicePixelRatio()
-        )
+        if self._asynchronous:
+            pixmap = EmojiImageProvider.requestPixmap(emoji_data, 0, icon_rect_adjusted.size(), dpr)
+            if pixmap is None:
+                self._wait_for(EmojiImageProvider.cacheKey(emoji_data, 0, icon_rect_adjusted.size(), dpr),
+                               getattr(option, "widget"), index)
+                self._paint_placeholder(painter, icon_rect_adjusted, palette)
+                painter.restore()
+                return
+        else:
+            pixmap = EmojiImageProvider.getPixmap(
+                emoji_data,
+                0,
+                icon_rect_adjusted.size(),
+                dpr
+            )
 
         # 4. Draw
         if not pixmap.isNull():
@@ -58,3 +93,87 @@ class QLazyLoadingEmojiDelegate(QStyledItemDelegate):
 
     def sizeHint(self, option, index):
         return QSize(40, 40)  # Fixed size for performance
+
+    def prewarm(self, emojis: typing.Iterable[Emoji], dpr: float) -> int:
+        """
+        Renders the given emojis in the background at the size this delegate draws them,
+        so their cells don't miss the cache when painted. Returns how many were queued.
+        """
+        if self._atlas_mode:
+            # Atlas cells are rendered in the GUI thread
+            return 0
+        size = self._icon_rect(QRect(QPoint(), self.sizeHint(None, None))).size()
+        return EmojiImageProvider.prewarm(emojis, size, dpr)
+
+    @staticmethod
+    def _icon_rect(rect: QRect) -> QRect:
+        return rect.adjusted(4, 4, -4, -4)
+
+    # --- Atlas Mode ---
+
+    def atlasMode(self) -> bool:
+        return self._atlas_mode
+
+    def setAtlasMode(self, atlas_mode: bool):
+        self._atlas_mode = atlas_mode
+
+    # --- Asynchronous Loading ---
+
+    def asynchronous(self) -> bool:
+        return self._asynchronous
+
+    def setAsynchronous(self, asynchronous: bool):
+        if self._asynchronous == asynchronous:
+            return
+
+        self._asynchronous = asynchronous
+
+        notifier = EmojiImageProvider.notifier()
+        if asynchronous:
+            notifier.pixmapReady.connect(self._on_pixmap_ready)
+        else:
+            notifier.pixmapReady.disconnect(self._on_pixmap_ready)
+            self.cancelPending()
+
+    def cancelPending(self):
+        """
+        Cancels the queued renderings of this delegate (e.g. cells scrolled out of view).
+        Renderings already running are kept. The cells of cancelled ones that are still shown
+        are repainted (scrolling doesn't repaint them), so they request them again.
+        """
+        if not self._pending:
+            return
+        EmojiImageProvider.cancelPending(self._pending.keys())
+        for key in list(self._pending):
+            if not EmojiImageProvider.isPending(key):
+                self._update_cells(self._pending.pop(key))
+
+    def _wait_for(self, key: tuple, view, index):
+        if view is None:
+            view = self.parent()
+            if view is None:
+                return
+        cell = (view, QPersistentModelIndex(index))
+        cells = self._pending.setdefault(key, [])
+        if cell not in cells:
+            cells.append(cell)
+
+    def _on_pixmap_ready(self, key: tuple):
+        self._update_cells(self._pending.pop(key, ()))
+
+    @staticmethod
+    def _update_cells(cells: typing.Iterable[typing.Tuple[typing.Any, QPersistentModelIndex]]):
+        # Cells out of view aren't repainted
+        for view, index in cells:
+            if index.isValid():
+                view.update(index.model().index(index.row(), index.column(), index.parent()))
+
+    @staticmethod
+    def _paint_placeholder(painter: QPainter, rect, palette):
+        side = min(rect.width(), rect.height()) // 2
+        placeholder = rect.adjusted((rect.width() - side) // 2, (rect.height() - side) // 2,
+                                    -(rect.width() - side) // 2, -(rect.height() - side) // 2)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(palette.midlight())
+        painter.drawEllipse(placeholder)
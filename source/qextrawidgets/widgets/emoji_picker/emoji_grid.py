@@ -39,7 +39,8 @@ class QEmojiGrid(QListView):
         self.setGridSize(QSize(40, 40))
 
         # Performance configuration
-        self.setItemDelegate(QLazyLoadingEmojiDelegate(self))
+        self.__delegate = QLazyLoadingEmojiDelegate(self)
+        self.setItemDelegate(self.__delegate)
 
         # Default settings
         self.setViewMode(QListView.ViewMode.IconMode)
@@ -121,6 +122,11 @@ class QEmojiGrid(QListView):
                 emoji = item.data(Qt.ItemDataRole.UserRole)
                 self.mouseEnteredEmoji.emit(emoji, item)
 
+    def hideEvent(self, e):
+        """Hidden cells don't need their pending emoji renderings anymore."""
+        self.cancelPendingLoads()
+        super().hideEvent(e)
+
     def leaveEvent(self, e: QEvent):
         """Ensures exit signal is emitted when leaving the widget."""
         if self.__last_index:
@@ -205,9 +211,49 @@ class QEmojiGrid(QListView):
 
     def filterContent(self, text: str):
         """Applies filter."""
+        self.cancelPendingLoads()
         self.__proxy.setFilterFixedString(text)
         self.updateGeometry() # Readjusts height based on what's left
 
+    def setAsynchronousLoading(self, asynchronous: bool):
+        """Renders emojis that are not cached yet in background threads, painting a placeholder meanwhile."""
+        self.__delegate.setAsynchronous(asynchronous)
+
+    def asynchronousLoading(self) -> bool:
+        return self.__delegate.asynchronous()
+
+    def setAtlasMode(self, atlas_mode: bool):
+        """Draws emojis from one sprite atlas per size instead of individual pixmaps."""
+        self.__delegate.setAtlasMode(atlas_mode)
+
+    def atlasMode(self) -> bool:
+        return self.__delegate.atlasMode()
+
+    def prewarm(self, rows: typing.Optional[int] = None) -> int:
+        """
+        Renders emojis in the background before they are shown: the given number of rows
+        just past the visible part of the grid, or all of its (filtered) emojis if rows is None.
+        Returns how many were queued.
+        """
+        count = self.__proxy.rowCount()
+        if rows is None:
+            positions = range(count)
+        else:
+            visible = self.viewport().visibleRegion().boundingRect()
+            if visible.isEmpty():
+                return 0
+            grid_sz = self.gridSize()
+            items_per_row = max(1, self.viewport().width() // grid_sz.width())
+            first_row = visible.bottom() // grid_sz.height() + 1
+            positions = range(min(first_row * items_per_row, count), min((first_row + rows) * items_per_row, count))
+
+        emojis = [self.__proxy.index(position, 0).data(Qt.ItemDataRole.UserRole) for position in positions]
+        return self.__delegate.prewarm(emojis, self.devicePixelRatioF())
+
+    def cancelPendingLoads(self):
+        """Cancels queued background renderings (e.g. when cells leave the viewport)."""
+        self.__delegate.cancelPending()
+
     def setLimit(self, limit: int):
         self.__limit = limit
 
@@ -1,6 +1,6 @@
 import typing
 
-from PySide6.QtCore import QCoreApplication, Signal, QSize
+from PySide6.QtCore import QCoreApplication, Signal, QSize, QTimer, QRect, QPoint
 from PySide6.QtGui import QAction, QStandardItem, QFont
 from PySide6.QtWidgets import (QLineEdit, QHBoxLayout, QLabel, QVBoxLayout,
                                QMenu, QWidget, QApplication, QButtonGroup)
@@ -24,6 +24,9 @@ class QEmojiPicker(QWidget):
     favorite = Signal(Emoji, QStandardItem)
     removedFavorite = Signal(Emoji, QStandardItem)  # renamed to camelCase
 
+    # Time (in milliseconds) the scrolling must pause before the grids in view are updated
+    _SCROLL_SETTLE_DELAY = 100
+
     _translations = {
         "Activities": QCoreApplication.translate("QEmojiPicker", "Activities"),
         "Food & Drink": QCoreApplication.translate("QEmojiPicker", "Food & Drink"),
@@ -58,6 +61,15 @@ class QEmojiPicker(QWidget):
         # Private variables
         self.__favorite_category = None
         self.__recent_category = None
+        self.__asynchronous_loading = False
+        self.__atlas_mode = False
+        self.__prewarm_rows = 2
+        # Grids that were in the viewport when the scrolling last settled
+        self.__grids_in_view: typing.Set[QEmojiGrid] = set()
+        self.__scroll_timer = QTimer(self)
+        self.__scroll_timer.setSingleShot(True)
+        self.__scroll_timer.setInterval(self._SCROLL_SETTLE_DELAY)
+        self.__scroll_timer.timeout.connect(self.__on_scroll_settled)
         self.__categories_data = {}  # Stores references to grids and layouts
         # Layout inside the scroll area where grids are located
         self.__accordion = QAccordion()
@@ -108,11 +120,45 @@ class QEmojiPicker(QWidget):
         self.__line_edit.textChanged.connect(self.__filter_emojis)
         self.__accordion.enteredSection.connect(self.__on_entered_section)
         self.__accordion.leftSection.connect(self.__on_left_section)
+        self.__accordion.scrollArea().verticalScrollBar().valueChanged.connect(self.__on_scroll)
+
+    def __on_scroll(self, _):
+        # Restarted by every step of a scroll, so the grids are only updated once it pauses
+        self.__scroll_timer.start()
+
+    def __on_scroll_settled(self):
+        grids_in_view = set(self.__visible_grids())
+        # Grids scrolled out of view no longer need their queued renderings
+        if self.__asynchronous_loading:
+            for grid in self.__grids_in_view - grids_in_view:
+                grid.cancelPendingLoads()
+        self.__grids_in_view = grids_in_view
+        # Rows about to be scrolled into view
+        for grid in grids_in_view:
+            grid.prewarm(self.__prewarm_rows)
+
+    def __visible_grids(self) -> typing.Generator[QEmojiGrid, None, None]:
+        """Yields the grids whose rectangle intersects the viewport of the scroll area."""
+        viewport = self.__accordion.scrollArea().viewport()
+        for category in self.__categories_data.values():
+            grid = category.grid()
+            if grid.isVisible() and QRect(grid.mapTo(viewport, QPoint(0, 0)), grid.size()).intersects(viewport.rect()):
+                yield grid
 
     def __on_entered_section(self, section: QAccordionItem):
         category: EmojiCategory = self.__categories_data[section.objectName()]
         if section.header().isExpanded():
             category.shortcut().setChecked(True)
+        self.__prewarm_next_category(section)
+
+    def __prewarm_next_category(self, section: QAccordionItem):
+        """Renders the category after section in the background, before it is scrolled into view."""
+        sections = self.__accordion.items()
+        position = sections.index(section) + 1 if section in sections else len(sections)
+        if position < len(sections):
+            category = self.__categories_data.get(sections[position].objectName())
+            if category is not None:
+                category.grid().prewarm()
 
     def __on_left_section(self, section: QAccordionItem):
         category: EmojiCategory = self.__categories_data[section.objectName()]
@@ -250,6 +296,8 @@ class QEmojiPicker(QWidget):
 
         # Grid
         grid = category.grid()
+        grid.setAsynchronousLoading(self.__asynchronous_loading)
+        grid.setAtlasMode(self.__atlas_mode)
         # Connect grid signals to Picker signals
         grid.emojiClicked.connect(lambda emoji, item: self.picked.emit(emoji))
         grid.mouseEnteredEmoji.connect(self.__on_mouse_enter_emoji)
@@ -268,6 +316,7 @@ class QEmojiPicker(QWidget):
 
     def removeCategory(self, category: EmojiCategory):
         self.__categories_data.pop(category.name(), None)
+        self.__grids_in_view.discard(category.grid())
         self.__accordion.removeAccordionItem(category.accordionItem())
         self._shortcuts_layout.removeWidget(category.shortcut())
         self._shortcuts_group.removeButton(category.shortcut())
@@ -307,4 +356,37 @@ class QEmojiPicker(QWidget):
         self.__recent_category = active
 
     def accordion(self) -> QAccordion:
-        return self.__accordion
\ No newline at end of file
+        return self.__accordion
+
+    def setAsynchronousLoading(self, asynchronous: bool):
+        """Renders emojis that are not cached yet in background threads instead of while painting."""
+        self.__asynchronous_loading = asynchronous
+        for category in self.__categories_data.values():
+            category.grid().setAsynchronousLoading(asynchronous)
+
+    def asynchronousLoading(self) -> bool:
+        return self.__asynchronous_loading
+
+    def prewarmCategory(self, name: str) -> int:
+        """
+        Renders the emojis of a category in the background (e.g. before the picker is first
+        shown). Returns how many were queued.
+        """
+        category = self.category(name)
+        return category.grid().prewarm() if category is not None else 0
+
+    def setPrewarmRows(self, rows: int):
+        """Sets how many rows past the viewport are rendered in the background while scrolling."""
+        self.__prewarm_rows = rows
+
+    def prewarmRows(self) -> int:
+        return self.__prewarm_rows
+
+    def setAtlasMode(self, atlas_mode: bool):
+        """Draws emojis from one sprite atlas per size instead of individual pixmaps."""
+        self.__atlas_mode = atlas_mode
+        for category in self.__categories_data.values():
+            category.grid().setAtlasMode(atlas_mode)
+
+    def atlasMode(self) -> bool:
+        return self.__atlas_mode
\ No newline at end of file
@@ -1,5 +1,5 @@
 from PySide6.QtCore import QMimeData, QSize, Qt
-from PySide6.QtGui import QKeyEvent, QValidator
+from PySide6.QtGui import QKeyEvent, QValidator, QResizeEvent
 from PySide6.QtWidgets import QTextEdit, QSizePolicy
 
 # Ensure the import is correct for your project
@@ -21,6 +21,11 @@ class QExtraTextEdit(QTextEdit):
         # Initialization
         self.setResponsive(True)
 
+        # The document converts the visible blocks first (progressive mode) or only the blocks
+        # around them (lazy mode)
+        self.verticalScrollBar().valueChanged.connect(self._update_visible_blocks)
+        self.textChanged.connect(self._update_visible_blocks)
+
         # Size Policy Adjustment
         # For a growing widget, 'Minimum' or 'Preferred' vertically is better than 'Expanding'
         size_policy = self.sizePolicy()
@@ -51,6 +56,10 @@ class QExtraTextEdit(QTextEdit):
 
         return super().sizeHint()
 
+    def resizeEvent(self, event: QResizeEvent):
+        super().resizeEvent(event)
+        self._update_visible_blocks()
+
     def createMimeDataFromSelection(self) -> QMimeData:
         """Preserves custom emojis when copying/dragging."""
         document: QTwemojiTextDocument = self.document()
@@ -121,6 +130,17 @@ class QExtraTextEdit(QTextEdit):
         else:
             self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
 
+    def _update_visible_blocks(self):
+        """Tells the document which blocks are shown in the viewport, if it is progressive or lazy."""
+        document = self.document()
+        if not isinstance(document, QTwemojiTextDocument) or not (document.progressive() or document.lazy()):
+            return
+
+        viewport = self.viewport().rect()
+        first = self.cursorForPosition(viewport.topLeft()).blockNumber()
+        last = self.cursorForPosition(viewport.bottomRight()).blockNumber()
+        document.setVisibleBlocks(first, last)
+
     def keyPressEvent(self, event: QKeyEvent):
         if self._validator is None:
             return super().keyPressEvent(event)
@@ -1,8 +1,22 @@
+import gc
+import os
+import threading
+import time
+import weakref
+
 import pytest
-from PySide6.QtGui import QValidator
+from PySide6.QtCore import QSize, QRect, QThread, QRunnable
+from PySide6.QtGui import QValidator, QPixmap, QTextCursor, QTextDocument, QImage, QPainter, QStandardItemModel, \
+    QStandardItem, QAbstractTextDocumentLayout
+from PySide6.QtWidgets import QApplication
+from shiboken6 import Shiboken
 
-from qextrawidgets.emoji_utils import EmojiFinder
+from qextrawidgets.emoji_utils import (EmojiFinder, EmojiTrie, EmojiResolver, EmojiImageProvider, EmojiPixmapCache,
+                                       EmojiDiskCache, EmojiAtlas, EmojiSourceCache)
+from qextrawidgets.delegates import QStandardTwemojiDelegate
+from qextrawidgets.documents import QTwemojiTextDocument
 from qextrawidgets.validators import QEmojiValidator
+from qextrawidgets.widgets.emoji_picker import QLazyLoadingEmojiDelegate, QEmojiPicker, QEmojiGrid
 
 
 # emoji test file: https://unicode.org/Public/emoji/latest/emoji-test.txt
@@ -21,6 +35,11 @@ def get_emoji_db():
 emoji_db = get_emoji_db()
 
 
+@pytest.fixture(scope="module")
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
 @pytest.mark.parametrize("emoji", emoji_db)
 def test_emoji_finder_finds_all_emojis(emoji):
     matches = EmojiFinder.findEmojis(emoji)
@@ -73,3 +92,984 @@ def test_emoji_validator_accepts_empty():
     validator = QEmojiValidator()
     state, _, _ = validator.validate("", 0)
     assert state == QValidator.State.Acceptable
+
+
+def test_emoji_finder_regexes_are_shared():
+    assert EmojiFinder.getRegex() is EmojiFinder.getRegex()
+    assert EmojiFinder.getAliasRegex() is EmojiFinder.getAliasRegex()
+    assert EmojiFinder.getColorRegex() is EmojiFinder.getColorRegex()
+    assert EmojiFinder.getValidatorRegex().isValid()
+
+
+def test_emoji_finder_find_aliases():
+    matches = list(EmojiFinder.findEmojiAliases("Hi :smile: and :not_an_alias: :joy:"))
+    assert [emoji.emoji for emoji, _ in matches] == ["😄", "😂"]
+
+
+@pytest.mark.parametrize("ignore_colors", [False, True])
+def test_emoji_trie_engine_matches_regex_engine(ignore_colors):
+    with open('tests/emoji-test.txt', encoding="utf-8") as file:
+        text = file.read()
+
+    def find_all(engine):
+        EmojiFinder.setEngine(engine)
+        return [(emoji.emoji, match.capturedStart(0), match.capturedEnd(0), match.captured(0))
+                for emoji, match in EmojiFinder.findEmojiObjects(text, ignore_colors)]
+
+    previous = EmojiFinder.engine()
+    try:
+        assert find_all(EmojiFinder.Engine.Trie) == find_all(EmojiFinder.Engine.Regex)
+    finally:
+        EmojiFinder.setEngine(previous)
+
+
+def test_emoji_trie_mixed_content():
+    text = "Hi 👋🏽 🇧🇷🇯🇵 #️⃣ 👨‍👩‍👧‍👦 ok"
+    found = [(start, end, emoji.emoji) for start, end, emoji in EmojiTrie.instance().scan(text, True)]
+    assert [emoji for _, _, emoji in found] == ["👋", "🇧🇷", "🇯🇵", "#️⃣", "👨‍👩‍👧‍👦"]
+    assert found[0][:2] == (3, 5)
+
+
+def test_emoji_finder_tokenize():
+    texts = ["no emojis", "a 😂 b 👍🏽", "🇧🇷"]
+    spans = EmojiFinder.tokenize(texts)
+    assert len(spans) == 3
+    assert list(spans[0]) == []
+    assert list(spans[1][0:2]) == [2, 3]
+    assert list(spans[1][3:5]) == [6, 8]
+    assert [EmojiFinder.emojiFromId(emoji_id).emoji for emoji_id in spans[1][2::3]] == ["😂", "👍"]
+    assert list(EmojiFinder.tokenize(["a 😂 b"], utf16=True)[0][:2]) == [2, 4]
+
+
+def test_standard_twemoji_delegate_text_blocks():
+    blocks = QStandardTwemojiDelegate.get_text_blocks("Hi 👋🏽 there 🇧🇷")
+    assert blocks[0] == "Hi "
+    assert blocks[1].emoji == "👋"
+    assert blocks[2] == " there "
+    assert blocks[3].emoji == "🇧🇷"
+
+
+def test_standard_twemoji_delegate_prepare_texts(monkeypatch):
+    delegate = QStandardTwemojiDelegate(cache_limit=3)
+    tokenized = []
+    tokenize = EmojiFinder.tokenize
+    monkeypatch.setattr(EmojiFinder, "tokenize", lambda texts, *args: tokenized.append(list(texts)) or tokenize(texts, *args))
+    # One pass for the whole page, duplicates and cached texts left out
+    assert delegate.prepareTexts(["a 😂", "b 🎉", "a 😂"]) == 2
+    assert delegate.prepareTexts(["a 😂", "c"]) == 1
+    assert tokenized == [["a 😂", "b 🎉"], ["c"]]
+    tokenized.clear()
+    assert delegate._cached_text_blocks("b 🎉")[1].emoji == "🎉"
+    assert tokenized == []
+    # Not more than the cache holds
+    assert delegate.prepareTexts(["d", "e", "f", "g"]) == 3
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("🙂\u200d↔️", ["🙂", "↔️"]),
+    ("😶\u200d🌫", ["😶"]),
+    ("👩🏼\u200d✈", ["👩"]),
+    ("👨🏿\u200d🤝\u200d👨🏼", ["👨", "🤝", "👨"]),
+    ("❤\u200d🔥", ["🔥"]),
+])
+def test_standard_twemoji_delegate_unknown_sequences(text, expected):
+    # Sequences that aren't in the database are drawn as the emojis they are made of
+    blocks = QStandardTwemojiDelegate.get_text_blocks("a " + text + " b")
+    assert [block.emoji for block in blocks if not isinstance(block, str)] == expected
+    assert blocks[0].startswith("a ") and blocks[-1].endswith(" b")
+
+
+def test_emoji_finder_split_emoji_colors():
+    emoji, colors = EmojiFinder.splitEmojiColors("🧑🏻‍🤝‍🧑🏿")
+    assert emoji.emoji == "🧑‍🤝‍🧑"
+    assert colors == ("🏻", "🏿")
+    emoji, colors = EmojiFinder.splitEmojiColors("😂")
+    assert emoji.emoji == "😂"
+    assert colors == ()
+    assert EmojiFinder.splitEmojiColors("a🏽")[0] is None
+    assert EmojiFinder.removeEmojiColors("👍🏽 ok") == "👍 ok"
+
+
+def test_emoji_resolver_lru():
+    max_size = EmojiResolver.maxSize()
+    try:
+        EmojiResolver.clear()
+        EmojiResolver.setMaxSize(2)
+        assert EmojiResolver.byAlias("smile").emoji == "😄"
+        assert EmojiResolver.byAlias("smile").emoji == "😄"
+        assert EmojiResolver.byCode("😂").aliases[0] == "joy"
+        assert EmojiResolver.byCode("not an emoji") is None
+        assert (EmojiResolver.hits(), EmojiResolver.misses()) == (1, 3)
+        assert EmojiResolver.size() == 2
+        EmojiResolver.clear()
+        assert (EmojiResolver.hits(), EmojiResolver.misses(), EmojiResolver.size()) == (0, 0, 0)
+    finally:
+        EmojiResolver.setMaxSize(max_size)
+
+
+def test_emoji_image_provider_cache(qapp):
+    emoji = EmojiResolver.byAlias("joy")
+    first = EmojiImageProvider.getPixmap(emoji, 0, QSize(24, 24), 2.0)
+    assert first.size() == QSize(48, 48)
+    assert EmojiImageProvider.getPixmap(emoji, 0, QSize(24, 24), 2.0).cacheKey() == first.cacheKey()
+
+    EmojiImageProvider.cache().clear()
+    assert not EmojiImageProvider.getPixmap(emoji, 0, QSize(24, 24), 2.0).isNull()
+
+
+def test_emoji_pixmap_cache_budget(qapp):
+    pixmap = QPixmap(10, 10)  # 400 bytes
+    cache = EmojiPixmapCache(max_bytes=1000)
+    cache.insert(("a", 0, 10, 10, 1.0), pixmap)
+    cache.insert(("b", 0, 10, 10, 1.0), pixmap)
+    cache.insert(("a", 0, 20, 20, 1.0), pixmap)
+    assert cache.count() == 2
+    assert cache.bytes() == 800
+    assert cache.evictions() == 1
+    # The least recently used entry of the least recently used pool went first
+    assert cache.find(("a", 0, 10, 10, 1.0)) is None
+    assert cache.find(("b", 0, 10, 10, 1.0)) is not None
+    assert (cache.hits(), cache.misses()) == (1, 1)
+    assert cache.poolStats() == {(0, 20, 20, 1.0): (1, 400), (0, 10, 10, 1.0): (1, 400)}
+
+
+def test_emoji_image_provider_request_pixmap(qapp):
+    emoji = EmojiResolver.byAlias("rocket")
+    size = QSize(18, 18)
+    key = EmojiImageProvider.cacheKey(emoji, 1, size, 1.0)
+    EmojiImageProvider.cache().remove(key)
+    ready = []
+    EmojiImageProvider.notifier().pixmapReady.connect(ready.append)
+    try:
+        assert EmojiImageProvider.requestPixmap(emoji, 1, size, 1.0) is None
+        task = weakref.ref(EmojiImageProvider._pending[key])
+        EmojiImageProvider.threadPool().waitForDone()
+        qapp.processEvents()
+        assert ready == [key]
+        # Deleted by the pool once run
+        gc.collect()
+        assert task() is None
+        assert EmojiImageProvider.requestPixmap(emoji, 1, size, 1.0).size() == QSize(20, 20)
+    finally:
+        EmojiImageProvider.notifier().pixmapReady.disconnect(ready.append)
+
+
+def test_lazy_loading_emoji_delegate_cancel_pending(qapp, monkeypatch):
+    class View:
+        def __init__(self):
+            self.updated = []
+
+        def update(self, index):
+            self.updated.append(index.row())
+
+    model = QStandardItemModel()
+    model.appendRow(QStandardItem())
+    model.appendRow(QStandardItem())
+    view = View()
+    delegate = QLazyLoadingEmojiDelegate()
+    running, cancelled = ("running",), ("cancelled",)
+    delegate._wait_for(running, view, model.index(0, 0))
+    delegate._wait_for(cancelled, view, model.index(1, 0))
+    # Without a view (nor a parent) cells can't be repainted, so they aren't tracked
+    delegate._wait_for(running, None, model.index(1, 0))
+
+    # The running rendering can't be cancelled: its cell waits for it
+    monkeypatch.setattr(EmojiImageProvider, "cancelPending", lambda keys: 1)
+    monkeypatch.setattr(EmojiImageProvider, "isPending", lambda key: key == running)
+    delegate.cancelPending()
+    assert view.updated == [1]
+    assert list(delegate._pending) == [running]
+    delegate._on_pixmap_ready(running)
+    assert view.updated == [1, 0]
+    assert not delegate._pending
+
+
+def test_emoji_picker_scroll(qapp, monkeypatch):
+    prewarmed, cancelled = [], []
+    # Rows past the visible part (whole categories are prewarmed when their section is entered)
+    monkeypatch.setattr(QEmojiGrid, "prewarm", lambda grid, rows=None: rows is not None and prewarmed.append(grid) or 0)
+    monkeypatch.setattr(QEmojiGrid, "cancelPendingLoads", lambda grid: cancelled.append(grid))
+    picker = QEmojiPicker()
+    picker.setAsynchronousLoading(True)
+    picker.resize(400, 500)
+    picker.show()
+    qapp.processEvents()
+    scroll_bar = picker.accordion().scrollArea().verticalScrollBar()
+
+    def settle():
+        deadline = time.perf_counter() + QEmojiPicker._SCROLL_SETTLE_DELAY * 3 / 1000
+        while time.perf_counter() < deadline:
+            qapp.processEvents()
+
+    # A smooth scroll updates the grids once it pauses, only the ones in view
+    prewarmed.clear()
+    for value in range(0, 200, 10):
+        scroll_bar.setValue(value)
+        qapp.processEvents()
+    assert not prewarmed
+    settle()
+    grids = {category.grid() for category in picker.categories()}
+    assert prewarmed and len(prewarmed) == len(set(prewarmed)) < len(grids)
+    assert not cancelled
+    in_view = set(prewarmed)
+
+    # Grids scrolled out of view have their queued renderings cancelled
+    prewarmed.clear()
+    scroll_bar.setValue(scroll_bar.maximum())
+    settle()
+    assert set(cancelled) == in_view - set(prewarmed)
+    assert cancelled and not set(cancelled) & set(prewarmed)
+    picker.close()
+
+
+def test_emoji_disk_cache(qapp, tmp_path):
+    os.makedirs(tmp_path / "twemoji-cache-0.0.0-stale")
+    os.makedirs(tmp_path / "sessions")
+    emoji = EmojiResolver.byAlias("snake")
+    size = QSize(16, 16)
+    image = EmojiImageProvider.renderImage(emoji, 0, size, 1.0)
+
+    cache = EmojiDiskCache(tmp_path)
+    assert not os.path.exists(tmp_path / "twemoji-cache-0.0.0-stale")
+    # Directories the cache didn't create are kept
+    assert os.path.isdir(tmp_path / "sessions")
+    assert cache.load(emoji, 0, size, 1.0) is None
+    cache.store(emoji, 0, size, 1.0, image)
+
+    # A new instance (next launch) reads it back
+    cache = EmojiDiskCache(tmp_path)
+    loaded = cache.load(emoji, 0, size, 1.0)
+    assert loaded is not None
+    assert loaded.convertToFormat(image.format()) == image
+    assert cache.hits() == 1
+
+    # Corrupted files are discarded
+    path = cache._path(emoji, 0, size, 1.0)
+    with open(path, "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        last = file.read(1)[0]
+        file.seek(-1, os.SEEK_END)
+        file.write(bytes([last ^ 0xFF]))
+    assert cache.load(emoji, 0, size, 1.0) is None
+    assert cache.invalidated() == 1
+    assert not os.path.exists(path)
+
+
+def test_emoji_atlas(qapp, tmp_path):
+    emojis = [EmojiResolver.byAlias(alias) for alias in ("snake", "joy", "rocket")]
+    size = QSize(16, 16)
+
+    atlas = EmojiAtlas(1, size, 2.0, page_size=72)
+    atlas.build(emojis)
+    # 36x36 cells: 2x2 per page
+    assert atlas.count() == 3
+    assert atlas.pageCount() == 1
+    page, source = atlas.find(emojis[2])
+    assert source.toRect() == QRect(0, 36, 36, 36)
+    expected = EmojiImageProvider.renderImage(emojis[2], 1, size, 2.0)
+    assert page.toImage().copy(source.toRect()).convertToFormat(expected.format()) == expected
+
+    atlas.save(tmp_path)
+    loaded = EmojiAtlas.load(tmp_path)
+    assert loaded.key() == atlas.key()
+    assert loaded.count() == 3
+    assert all(loaded.contains(emoji) for emoji in emojis)
+    page, source = loaded.find(emojis[2])
+    assert page.toImage().copy(source.toRect()).convertToFormat(expected.format()) == expected
+
+    # Zooming through sizes keeps the atlases within their budget, the one in use always kept
+    max_bytes = EmojiImageProvider.maxAtlasBytes()
+    EmojiImageProvider.clearAtlases()
+    try:
+        EmojiImageProvider.getAtlasPixmap(emojis[0], 0, QSize(16, 16))
+        one_atlas = EmojiImageProvider.atlasBytes()
+        EmojiImageProvider.setMaxAtlasBytes(one_atlas * 2)
+        for side in range(16, 64, 4):
+            EmojiImageProvider.getAtlasPixmap(emojis[0], 0, QSize(side, side))
+            in_use = EmojiImageProvider.atlas(0, QSize(side, side)).bytes()
+            assert EmojiImageProvider.atlasBytes() - in_use <= one_atlas * 2
+        assert EmojiImageProvider.atlas(0, QSize(60, 60)).contains(emojis[0])
+        assert len(EmojiImageProvider._atlases) < 12
+    finally:
+        EmojiImageProvider.setMaxAtlasBytes(max_bytes)
+        EmojiImageProvider.clearAtlases()
+
+
+class BlockingRunnable(QRunnable):
+    """
+    Keeps a pool thread busy until released. A Python subclass, so that the wrapper knows when
+    the pool deletes it: a QRunnable.create one would stay mapped to its address once deleted,
+    and be returned in place of whatever Qt object is allocated there next.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def run(self):
+        self.release.wait()
+
+
+def test_emoji_image_provider_prewarm(qapp):
+    emojis = [EmojiResolver.byAlias(alias) for alias in ("ant", "bee", "bug")]
+    size = QSize(14, 14)
+    keys = [EmojiImageProvider.cacheKey(emoji, 0, size) for emoji in emojis]
+
+    # Queued at idle priority; nothing is left to queue once cached
+    assert EmojiImageProvider.prewarm(emojis, size) == 3
+    EmojiImageProvider.prewarmThreadPool().waitForDone()
+    qapp.processEvents()
+    assert all(EmojiImageProvider.cache().contains(key) for key in keys)
+    assert EmojiImageProvider.prewarm(emojis, size) == 0
+    assert EmojiImageProvider.pendingCount() == 0
+
+    # Cancelling drops whatever hasn't started yet (the pool is kept busy meanwhile)
+    pool = EmojiImageProvider.prewarmThreadPool()
+    pool.setMaxThreadCount(1)
+    blocker = BlockingRunnable()
+    release = blocker.release
+    pool.start(blocker)
+    del blocker
+    try:
+        emojis = [EmojiResolver.byAlias(alias) for alias in ("cat", "dog")]
+        assert EmojiImageProvider.prewarm(emojis, size) == 2
+        # A paint request moves a queued emoji to the regular pool
+        assert EmojiImageProvider.requestPixmap(emojis[0], 0, size) is None
+        task = weakref.ref(EmojiImageProvider._pending[EmojiImageProvider.cacheKey(emojis[1], 0, size)])
+        assert EmojiImageProvider.cancelPrewarm() == 1
+        # Deleted once taken back from the pool
+        gc.collect()
+        assert task() is None
+        EmojiImageProvider.threadPool().waitForDone()
+        qapp.processEvents()
+        assert EmojiImageProvider.cache().contains(EmojiImageProvider.cacheKey(emojis[0], 0, size))
+        assert not EmojiImageProvider.cache().contains(EmojiImageProvider.cacheKey(emojis[1], 0, size))
+        assert EmojiImageProvider.pendingCount() == 0
+    finally:
+        release.set()
+        pool.waitForDone()
+        pool.setMaxThreadCount(QThread.idealThreadCount())
+
+
+def test_emoji_source_cache(qapp):
+    emoji = EmojiResolver.byAlias("turtle")
+    for source_format in EmojiSourceCache.Format:
+        cache = EmojiSourceCache(source_format=source_format)
+        images = [cache.render(emoji, QSize(side, side)) for side in (16, 32, 100)]
+        assert [image.width() for image in images] == [16, 32, 100]
+        # One file open and parse for the three sizes
+        assert (cache.opens(), cache.parses(), cache.hits()) == (1, 1, 2)
+
+    cache = EmojiSourceCache(max_entries=1)
+    cache.render(EmojiResolver.byAlias("snail"), QSize(16, 16))
+    cache.render(emoji, QSize(16, 16))
+    assert cache.count() == 1
+    assert cache.render(EmojiResolver.byAlias("snail"), QSize(16, 16)).width() == 16
+    assert cache.opens() == 3
+
+    # From several threads, every rendering is counted once, as an open or a hit
+    cache = EmojiSourceCache()
+    emojis = [EmojiResolver.byAlias(alias) for alias in ("turtle", "snail", "ant", "bee", "bug", "cat")]
+
+    def render_all():
+        for _ in range(20):
+            for emoji in emojis:
+                cache.render(emoji, QSize(8, 8))
+
+    threads = [threading.Thread(target=render_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.opens() + cache.hits() == 4 * 20 * len(emojis)
+    assert cache.parses() == cache.opens()
+
+
+def test_emoji_image_provider_margin(qapp):
+    emoji = EmojiResolver.byAlias("joy")
+    for source_format in EmojiSourceCache.Format:
+        EmojiImageProvider.setSourceFormat(source_format)
+        try:
+            plain = EmojiImageProvider.renderImage(emoji, 0, QSize(20, 20), 2.0)
+            padded = EmojiImageProvider.renderImage(emoji, 1, QSize(20, 20), 2.0)
+        finally:
+            EmojiImageProvider.setSourceFormat(EmojiSourceCache.Format.Png)
+        assert padded.size() == QSize(44, 44) and padded.devicePixelRatio() == 2.0
+        assert padded.copy(QRect(2, 2, 40, 40)).convertToFormat(plain.format()) == plain
+        assert all(padded.pixel(x, y) == 0 for x, y in ((0, 0), (1, 21), (43, 43), (42, 10)))
+
+
+def emoji_image_count(document: QTwemojiTextDocument) -> int:
+    return sum(fragment.length() for block in document._blocks() for fragment in document.emoji_fragments(block))
+
+
+def test_twemoji_text_document_incremental(qapp):
+    document = QTwemojiTextDocument()
+    document.setPlainText("hi 😂 :smile: x\nline 2")
+    assert emoji_image_count(document) == 2
+
+    # Typed one character at a time
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    for char in " :rocket: 🇧🇷":
+        cursor.insertText(char)
+    assert emoji_image_count(document) == 4
+    assert document.toPlainText().endswith("line 2 🚀 🇧🇷")
+
+    # A regional indicator pair completed by a second keystroke
+    cursor.insertText("🇧")
+    cursor.insertText("🇷")
+    assert emoji_image_count(document) == 5
+
+    # Pasted in the middle of existing text
+    cursor.setPosition(3)
+    cursor.insertText("ab😎cd:tada:")
+    assert emoji_image_count(document) == 7
+    assert document.toPlainText().startswith("hi ab😎cd🎉😂")
+
+    # Aliases without twemoji
+    document = QTwemojiTextDocument(twemoji=False)
+    cursor = QTextCursor(document)
+    for char in "x :smile: y":
+        cursor.insertText(char)
+    assert document.toPlainText() == "x 😄 y"
+
+    # Context windows starting in the middle of a surrogate pair
+    for prefix in ("😂" * 40, "x" + "😂" * 40):
+        document = QTwemojiTextDocument(twemoji=False)
+        document.setPlainText(prefix)
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        for char in " :smile: 🎉":
+            cursor.insertText(char)
+        assert document.toPlainText() == prefix + " 😄 🎉"
+
+
+def test_twemoji_text_document_batched(qapp):
+    document = QTwemojiTextDocument()
+    document.setPlainText("😂" * 300 + " :smile:\n" + "x 😎 " * 300)
+    assert emoji_image_count(document) == 601
+    # The conversion of a loaded text isn't an undo step
+    assert not document.isUndoAvailable()
+
+    # Adjacent identical images are merged in a single fragment
+    document.setEmojiSize(20)
+    assert emoji_image_count(document) == 601
+    document.setTwemoji(False)
+    assert emoji_image_count(document) == 0
+    assert QTextDocument.toPlainText(document).startswith("😂" * 300 + " 😄\n")
+
+    # A paste and its conversion are undone together, then redone together
+    document = QTwemojiTextDocument()
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    cursor.insertText("a 😂 :smile: b")
+    cursor.endEditBlock()
+    assert emoji_image_count(document) == 2
+    document.undo()
+    assert QTextDocument.toPlainText(document) == ""
+    document.redo()
+    assert emoji_image_count(document) == 2
+
+    # A typed emoji is converted in a step of its own, which can be undone
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertText("🎉")
+    assert emoji_image_count(document) == 3
+    document.undo()
+    assert emoji_image_count(document) == 2
+    assert QTextDocument.toPlainText(document).endswith("b🎉")
+
+
+def test_twemoji_text_document_export(qapp):
+    document = QTwemojiTextDocument()
+    document.setPlainText("hello 😂😂 :smile:\nsecond 🇧🇷 line\n\nend")
+    text = "hello 😂😂 😄\nsecond 🇧🇷 line\n\nend"
+    assert emoji_image_count(document) == 4
+    assert document.toPlainText() == text
+
+    cursor = QTextCursor(document)
+    assert document.selectionToPlainText(cursor) == ""
+    # Part of a fragment, across an image
+    cursor.setPosition(1)
+    cursor.setPosition(7, QTextCursor.MoveMode.KeepAnchor)
+    assert document.selectionToPlainText(cursor) == "ello 😂"
+    # Across blocks
+    cursor.setPosition(8)
+    cursor.movePosition(QTextCursor.MoveOperation.NextBlock, QTextCursor.MoveMode.KeepAnchor)
+    cursor.movePosition(QTextCursor.MoveOperation.EndOfWord, QTextCursor.MoveMode.KeepAnchor)
+    assert document.selectionToPlainText(cursor) == " 😄\nsecond"
+    cursor.select(QTextCursor.SelectionType.Document)
+    assert document.selectionToPlainText(cursor) == text
+
+    # Other images are kept as objects
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertImage("other.png")
+    assert document.toPlainText() == text + "\ufffc"
+
+
+def test_twemoji_text_document_resize(qapp):
+    document = QTwemojiTextDocument()
+    document.setPlainText("a 😂😂😂 b 😄\nc 😂")
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertImage("other.png")
+    text = document.toPlainText()
+
+    document.setEmojiSize(30)
+    document.setEmojiMargin(2)
+    assert document.toPlainText() == text
+    assert emoji_image_count(document) == 5
+    for block in document._blocks():
+        for fragment in document.emoji_fragments(block):
+            image_format = fragment.charFormat().toImageFormat()
+            assert image_format.width() == image_format.height() == 34
+            assert "width=30" in image_format.name() and "margin=2" in image_format.name()
+            assert not document.resource(QTextDocument.ResourceType.ImageResource, image_format.name()).isNull()
+    # Other images are left alone
+    cursor.setPosition(cursor.position() - 1)
+    cursor.setPosition(cursor.position() + 1, QTextCursor.MoveMode.KeepAnchor)
+    assert cursor.charFormat().toImageFormat().name() == "other.png"
+
+
+def paint_document(document: QTwemojiTextDocument):
+    image = QImage(400, 200, QImage.Format.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    document.drawContents(painter)
+    painter.end()
+
+
+def test_twemoji_text_document_resources(qapp, monkeypatch):
+    loaded = []
+    load_resource = QTwemojiTextDocument.loadResource
+
+    def counted_load_resource(self, resource_type, name):
+        loaded.append(name.toString())
+        return load_resource(self, resource_type, name)
+
+    monkeypatch.setattr(QTwemojiTextDocument, "loadResource", counted_load_resource)
+    document = QTwemojiTextDocument()
+    document.setEmojiSize(16)
+    document.setPlainText("a 😂😂 b 😄\nc 😂 🎉")
+    # Loaded when painted, not when converted
+    assert document.resourceCount() == 0
+    paint_document(document)
+    assert document.resourceCount() == 3
+    assert document.resourceBytes() == 3 * 18 * 18 * 4
+    # Then held by the document: painting again doesn't load them
+    loaded.clear()
+    paint_document(document)
+    assert loaded == []
+
+    # Shared by the documents: the same pixmap, never copied into the document
+    other = QTwemojiTextDocument()
+    other.setEmojiSize(16)
+    other.setPlainText("🎉")
+    name = EmojiImageProvider.getUrl("tada", 1, QSize(16, 16), 1.0)
+    assert (document.resource(QTextDocument.ResourceType.ImageResource, name).cacheKey() ==
+            other.resource(QTextDocument.ResourceType.ImageResource, name).cacheKey())
+
+    # Resources left over from zooming are released
+    document.setEmojiSize(20)
+    paint_document(document)
+    assert document.resourceCount() == 6
+    assert document.releaseUnusedResources() == 3
+    assert document.resourceCount() == 3
+    assert document.resourceBytes() == 3 * 22 * 22 * 4
+
+    # And the ones removed by edits, on request only: edits never scan the document
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.NextBlock)
+    cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+    cursor.removeSelectedText()
+    assert not document._resource_sweep_timer.isActive()
+    assert document.resourceCount() == 3
+    assert document.releaseUnusedResources() == 1
+    assert document.resourceCount() == 2
+
+    # Brought back by an undo
+    document.undo()
+    paint_document(document)
+    assert document.resourceCount() == 3
+
+    # Capped: the least recently loaded ones are released first, and loaded again when painted
+    document.setMaxResourceBytes(2 * 22 * 22 * 4)
+    assert document.maxResourceBytes() == 2 * 22 * 22 * 4
+    assert document.resourceCount() == 2
+    assert document.resourceBytes() == 2 * 22 * 22 * 4
+    loaded.clear()
+    paint_document(document)
+    assert loaded
+    assert document.resourceCount() == 2
+    document.setMaxResourceBytes(0)
+    paint_document(document)
+    assert document.resourceCount() == 3
+    loaded.clear()
+    paint_document(document)
+    assert loaded == []
+
+
+def test_twemoji_text_document_full_passes(qapp, monkeypatch):
+    # Each full pass is a single batch of replacements, made from the last one to the first
+    # one, whatever the number of emojis (timings are in benchmarks/twemoji_text_document.py)
+    batches = []
+    replace_all = QTwemojiTextDocument._replace_all
+
+    def recording_replace_all(self, replacements, join_previous=False):
+        replacements = list(replacements)
+        batches.append([start for start, _, _ in replacements])
+        replace_all(self, replacements, join_previous)
+
+    monkeypatch.setattr(QTwemojiTextDocument, "_replace_all", recording_replace_all)
+    for count in (1000, 10000):
+        document = QTwemojiTextDocument(twemoji=False, alias_replacement=False)
+        document.setPlainText(("😂" * 50 + "\n") * (count // 50))
+        for twemoji in (True, False):
+            batches.clear()
+            document.setTwemoji(twemoji)
+            assert emoji_image_count(document) == (count if twemoji else 0)
+            assert len(batches) == 1 and len(batches[0]) == count
+            assert batches[0] == sorted(batches[0], reverse=True)
+
+
+def test_twemoji_text_document_progressive(qapp):
+    document = QTwemojiTextDocument()
+    document.setProgressive(True)
+    progress = []
+    document.twemojizeProgress.connect(lambda done, total: progress.append((done, total)))
+
+    lines = ["line %d 😂 :smile:" % number for number in range(1000)]
+    document.setPlainText("\n".join(lines))
+    assert document.isProcessing()
+    assert emoji_image_count(document) == 0
+
+    # Visible blocks are converted first
+    document.setVisibleBlocks(500, 510)
+    document._process_pending_chunk()
+    block = document.findBlockByNumber(505)
+    assert sum(fragment.length() for fragment in document.emoji_fragments(block)) == 2
+    assert not list(document.emoji_fragments(document.firstBlock()))
+    # Converting a loaded text isn't an undo step
+    assert not document.isUndoAvailable()
+
+    # Still editable meanwhile
+    cursor = QTextCursor(document)
+    cursor.insertText("🎉 ")
+
+    while document.isProcessing():
+        qapp.processEvents()
+    assert emoji_image_count(document) == 2001
+    assert document.toPlainText() == "🎉 " + "\n".join(lines).replace(":smile:", "😄")
+    assert progress[-1][0] == progress[-1][1]
+
+    # Small changes are still converted within the change
+    cursor.insertText("😎")
+    assert emoji_image_count(document) == 2002
+
+
+def test_twemoji_text_document_progressive_undo(qapp):
+    document = QTwemojiTextDocument()
+    document.setProgressive(True)
+    document.setPlainText("start")
+    cursor = QTextCursor(document)
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertText(" typed")
+
+    # A paste converted in many chunks is undone at once
+    cursor.beginEditBlock()
+    cursor.insertText("".join("\nline %d 😂 :smile:" % number for number in range(3000)))
+    cursor.endEditBlock()
+    assert document.isProcessing()
+    document.processPending()
+    assert emoji_image_count(document) == 6000
+    document.undo()
+    assert document.toPlainText() == "start typed"
+    document.undo()
+    assert document.toPlainText() == "start"
+
+
+def test_twemoji_text_document_lazy(qapp):
+    document = QTwemojiTextDocument()
+    document.setLazy(True)
+    document.setPrefetchBlocks(10)
+    document.setReleaseBlocks(20)
+
+    lines = ["line %d 😂 :smile:" % number for number in range(1000)]
+    text = "\n".join(lines).replace(":smile:", "😄")
+    document.setPlainText("\n".join(lines))
+    # Nothing is shown yet, aliases are replaced anyway
+    assert emoji_image_count(document) == 0
+    assert document.toPlainText() == text
+
+    # Visible blocks and the prefetch margin
+    document.setVisibleBlocks(500, 509)
+    assert emoji_image_count(document) == 2 * 30
+    assert not list(document.emoji_fragments(document.findBlockByNumber(489)))
+    assert list(document.emoji_fragments(document.findBlockByNumber(490)))
+
+    # Scrolling a little converts more, blocks beyond the release distance go back to text
+    document.setVisibleBlocks(525, 534)
+    assert not list(document.emoji_fragments(document.findBlockByNumber(504)))
+    assert list(document.emoji_fragments(document.findBlockByNumber(505)))
+    assert list(document.emoji_fragments(document.findBlockByNumber(544)))
+    assert emoji_image_count(document) == 2 * 40
+
+    # Scrolling far away
+    document.setVisibleBlocks(0, 9)
+    assert emoji_image_count(document) == 2 * 20
+    assert document.toPlainText() == text
+
+    # Edits are converted within the converted blocks only
+    cursor = QTextCursor(document)
+    cursor.insertText("🎉 :tada: ")
+    assert emoji_image_count(document) == 2 * 21
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertText(" 🎉 :tada:")
+    assert emoji_image_count(document) == 2 * 21
+    assert document.toPlainText() == "🎉 🎉 " + text + " 🎉 🎉"
+
+    document.setLazy(False)
+    assert emoji_image_count(document) == 2004
+
+
+def test_twemoji_text_document_emoji_size_cache(qapp, monkeypatch):
+    heights = []
+
+    def font_height(font):
+        heights.append(font.key())
+        return 20
+
+    monkeypatch.setattr(QTwemojiTextDocument, "_font_height", staticmethod(font_height))
+    document = QTwemojiTextDocument()
+    cursor = QTextCursor(document)
+    cursor.insertText("😂 😄 🎉 " * 500)
+    assert emoji_image_count(document) == 1500
+    assert len(heights) == 1
+    # Same images for the same emojis
+    formats = {fragment.charFormat().toImageFormat().name() for fragment in document.emoji_fragments(document.begin())}
+    assert len(formats) == 3 and all("width=18" in name for name in formats)
+
+    font = document.defaultFont()
+    font.setPointSize(font.pointSize() + 4)
+    document.setDefaultFont(font)
+    assert len(heights) == 2 and heights[1] == font.key()
+
+    # Fixed size doesn't need the font
+    document.setEmojiSize(30)
+    cursor.insertText("😂")
+    assert len(heights) == 2
+
+
+def test_twemoji_text_document_stream(qapp, tmp_path):
+    lines = ["line %d 😂 :smile: 👨‍👩‍👧" % number for number in range(300)]
+    text = "\n".join(lines).replace(":smile:", "😄")
+    path = tmp_path / "log.txt"
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+    # From a file, in chunks cutting lines, emojis and aliases
+    document = QTwemojiTextDocument()
+    document.streamPlainText(path, chunk_size=7)
+    assert document.toPlainText() == text
+    assert emoji_image_count(document) == 900
+    assert not document.isUndoAvailable()
+
+    # From an iterable, appended to the current text, within the line limit
+    document = QTwemojiTextDocument()
+    document.setPlainText("first ")
+    document.setLimitTreatment(QTwemojiTextDocument.LimitTreatment.RemoveFirstLines)
+    document.setLineLimit(50)
+    document.streamPlainText((line + "\n" for line in lines), chunk_size=100)
+    assert document.blockCount() == 50
+    assert document.toPlainText() == "\n".join(text.split("\n")[-49:]) + "\n"
+    assert emoji_image_count(document) == 49 * 3
+
+    # Or keeping the first lines, without reading the rest once full
+    document = QTwemojiTextDocument()
+    document.setLineLimit(50)
+    read = []
+    finished = []
+    document.streamFinished.connect(lambda: finished.append(True))
+    document.streamPlainText((read.append(line) or line + "\n" for line in lines), chunk_size=100)
+    assert finished and not document.isStreaming()
+    assert document.toPlainText() == "\n".join(text.split("\n")[:50])
+    assert emoji_image_count(document) == 50 * 3
+    assert len(read) < 100
+
+    # Asynchronously
+    document = QTwemojiTextDocument()
+    finished = []
+    document.streamFinished.connect(lambda: finished.append(True))
+    document.streamPlainText(path, chunk_size=64, asynchronous=True)
+    assert document.isStreaming()
+    deadline = time.perf_counter() + 10
+    while not finished and time.perf_counter() < deadline:
+        qapp.processEvents()
+    assert finished and not document.isStreaming()
+    assert document.toPlainText() == text
+
+    # Cancelled
+    document = QTwemojiTextDocument()
+    document.streamPlainText(path, chunk_size=64, asynchronous=True)
+    qapp.processEvents()
+    document.cancelStream()
+    qapp.processEvents()
+    assert not document.isStreaming()
+    assert text.startswith(document.toPlainText())
+    assert len(document.toPlainText()) < len(text)
+
+
+def test_twemoji_text_document_line_limit(qapp):
+    document = QTwemojiTextDocument()
+    document.setLineLimit(3)
+    assert document.limitTreatment() == QTwemojiTextDocument.LimitTreatment.RemoveLastLines
+    cursor = QTextCursor(document)
+    cursor.insertText("a 😂\nb :smile:\nc\nd\ne")
+    assert document.toPlainText() == "a 😂\nb 😄\nc"
+    assert emoji_image_count(document) == 2
+
+    # Removed in a single change
+    changes = []
+    document.contentsChange.connect(lambda *change: changes.append(change))
+    document.setLimitTreatment(QTwemojiTextDocument.LimitTreatment.RemoveFirstLines)
+    for line in ("d", "e 🎉", "f"):
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText("\n" + line)
+    assert document.toPlainText() == "d\ne 🎉\nf"
+    assert emoji_image_count(document) == 1
+    changes.clear()
+    cursor.movePosition(QTextCursor.MoveOperation.End)
+    cursor.insertText("\ng\nh")
+    assert document.toPlainText() == "f\ng\nh"
+    # "d\ne 🎉\n", the emoji being a single image character
+    assert [change[1] for change in changes if change[1]] == [6]
+
+    # Edits that don't add lines aren't trimmed, nor are lines restored by an undo
+    cursor.insertText("i")
+    assert document.toPlainText() == "f\ng\nhi"
+    document.undo()
+    document.undo()
+    assert document.toPlainText() == "d\ne 🎉\nf\ng\nh"
+    document.redo()
+    assert document.toPlainText() == "f\ng\nh"
+
+    # Lowering the limit trims right away, and no limit keeps everything
+    document.setLineLimit(1)
+    assert document.toPlainText() == "h"
+    document.setLineLimit(0)
+    cursor.insertText("\nj\nk")
+    assert document.blockCount() == 3
+
+    # Exactly the limit, unless a slack removes more of the first lines at once
+    document = QTwemojiTextDocument()
+    document.setLimitTreatment(QTwemojiTextDocument.LimitTreatment.RemoveFirstLines)
+    document.setLineLimit(40)
+    assert document.lineLimitSlack() == 0
+    cursor = QTextCursor(document)
+    cursor.insertText("\n".join(str(number) for number in range(41)))
+    assert document.toPlainText() == "\n".join(str(number) for number in range(1, 41))
+    document.setLineLimitSlack(2)
+    cursor.insertText("\n41")
+    assert document.toPlainText() == "\n".join(str(number) for number in range(4, 42))
+    cursor.insertText("\n42\n43")
+    assert document.toPlainText() == "\n".join(str(number) for number in range(4, 44))
+
+
+def test_twemoji_text_document_lazy_undo(qapp):
+    document = QTwemojiTextDocument()
+    document.setLazy(True)
+    document.setPrefetchBlocks(10)
+    lines = ["line %d 😂" % number for number in range(1000)]
+    document.setPlainText("\n".join(lines))
+    document.setModified(False)
+
+    # Scrolling isn't an edit
+    document.setVisibleBlocks(0, 9)
+    document.setVisibleBlocks(500, 509)
+    assert emoji_image_count(document) == 30
+    assert document.availableUndoSteps() == 0
+    assert not document.isModified()
+
+    cursor = QTextCursor(document)
+    cursor.insertText("x")
+    steps = document.availableUndoSteps()
+    for first in range(0, 1000, 50):
+        document.setVisibleBlocks(first, first + 9)
+    assert document.availableUndoSteps() == steps
+    assert document.isModified()
+
+    # The first undo is the typed text
+    document.undo()
+    assert document.toPlainText() == "\n".join(lines)
+    assert not document.isUndoAvailable()
+
+    # Turned on with something to undo, everything stays converted
+    document = QTwemojiTextDocument()
+    document.setPlainText("a 😂\nb 😂")
+    QTextCursor(document).insertText("x")
+    steps = document.availableUndoSteps()
+    document.setLazy(True)
+    document.setVisibleBlocks(0, 0)
+    assert emoji_image_count(document) == 2
+    assert document.availableUndoSteps() == steps
+
+
+def test_twemoji_text_document_name_caches(qapp, monkeypatch):
+    monkeypatch.setattr(QTwemojiTextDocument, "_NAME_CACHE_SIZE", 4)
+    document = QTwemojiTextDocument()
+    document.setPlainText("😂 🎉")
+    # Zooming through many sizes doesn't grow the caches shared by every document
+    for size in range(10, 30):
+        document.setEmojiSize(size)
+        assert document.toPlainText() == "😂 🎉"
+        paint_document(document)
+    assert len(QTwemojiTextDocument._OBJECT_TEXT_CACHE) <= 4
+    assert len(QTwemojiTextDocument._URL_ARGUMENTS_CACHE) <= 4
+
+
+def test_twemoji_text_document_teardown(qapp):
+    # Render tasks run, are cancelled or taken back from the pools while documents come and go
+    pool = EmojiImageProvider.prewarmThreadPool()
+    pool.setMaxThreadCount(1)
+    blocker = BlockingRunnable()
+    release = blocker.release
+    pool.start(blocker)
+    del blocker
+    try:
+        size = QSize(13, 13)
+        emojis = [EmojiResolver.byAlias(alias) for alias in ("owl", "bat", "koala")]
+        for emoji in emojis:
+            EmojiImageProvider.cache().remove(EmojiImageProvider.cacheKey(emoji, 0, size))
+        EmojiImageProvider.prewarm(emojis, size)
+        EmojiImageProvider.requestPixmap(emojis[0], 0, size)
+        EmojiImageProvider.cancelPrewarm()
+    finally:
+        release.set()
+        pool.waitForDone()
+        pool.setMaxThreadCount(QThread.idealThreadCount())
+    EmojiImageProvider.threadPool().waitForDone()
+    qapp.processEvents()
+
+    # No wrapper is left over from the deleted tasks
+    gc.collect()
+    assert not [wrapper for wrapper in Shiboken.getAllValidWrappers() if isinstance(wrapper, QRunnable)]
+
+    # Documents holding cursors (lazy, progressive) and running timers are destroyed
+    for _ in range(5):
+        documents = []
+        for mode in ("lazy", "progressive", "stream"):
+            document = QTwemojiTextDocument()
+            document.setPlainText("line 😂 :smile:\n" * 100)
+            if mode == "lazy":
+                document.setLazy(True)
+                document.setVisibleBlocks(50, 59)
+            elif mode == "progressive":
+                document.setProgressive(True)
+                QTextCursor(document).insertText("😄 " * 2000)
+            else:
+                document.streamPlainText(("😂\n" for _ in range(1000)), chunk_size=64, asynchronous=True)
+            assert isinstance(document.documentLayout(), QAbstractTextDocumentLayout)
+            documents.append(document)
+        qapp.processEvents()
+        del document
+        documents.clear()
+        gc.collect()
+    qapp.processEvents()